@@ -90,11 +90,17 @@ Features:
     * 'File('filename')' -- data from an existing data file (permits
                             additional option 'using' )
 
+    * 'NpyFile('filename.npy')' -- an array saved by 'numpy.save',
+                                   plotted straight from the file
+
     * 'Func('exp(4.0 * sin(x))')' -- functions (passed as a string,
                                      evaluated by gnuplot)
 
     * 'GridData(m, x, y)' -- data tabulated on a grid of (x,y) values
                              (usually to be plotted in 3-D)
+    * 'StreamingData()' -- data to which points are appended as they
+                           arrive (e.g., for live plots)
+    * 'RingBufferData(n)' -- the last n data points pushed into it
 
     See the documentation strings for those classes for more details.
 
@@ -104,9 +110,34 @@ Features:
     they can be replotted with their new options.
 
  o  Communication of commands to gnuplot is via a one-way pipe.
+    Each command is flushed as it is sent, except inside a
+    'with g.batch():' block, whose commands are flushed together.
     Communication of data from python to gnuplot is via inline data
     (through the command pipe) or via temporary files.  Temp files are
     deleted automatically when their associated 'PlotItem' is deleted.
+    They are kept in a private directory of the gnuplot_py3 object
+    that plotted them, which is deleted when the object is closed (or
+    at exit, or by a later process if this one crashed; see the
+    'tempdirs' module).  With 'memory=1' they are kept in memory (on
+    a tmpfs such as /dev/shm, or in a memfd) up to a size budget.
+    With 'transport="auto"', Data and GridData choose among all of
+    these ways to send data themselves, and record why (see the
+    'transports' module).  The choice can be tuned to the local
+    machine by running 'python -m gnuplot.calibration'.
+    Optionally ('cache=1'), temp files are shared between items that
+    plot the same data and kept in a cache for reuse (see the
+    'datacache' module).
+    Under Unix, data are by default sent through FIFOs (named pipes)
+    that each gnuplot_py3 object keeps for its PlotItems and reuses
+    for every plot; they are removed when the object is closed (see
+    the 'fifopool' module).
+    With 'datablock=1', data are instead sent once as a gnuplot named
+    datablock and are not sent again when the plot is redrawn (e.g.,
+    by 'replot' or 'hardcopy').
+    A File can be sent inline ('inline=1'), and inline Data can be
+    cached ('inline=1, cache=1'); under Unix the file is then moved to
+    the pipe by the kernel (os.sendfile) without being copied through
+    Python.
     The PlotItems in use by a gnuplot_py3 object at any given time are
     stored in an internal list so that they won't be deleted
     prematurely.
@@ -124,6 +155,10 @@ Features:
  o  Grid data for the splot command can be sent to gnuplot in binary
     format, saving time and disk space.
 
+ o  Missing data points can be given as NaNs or as masked values of
+    'numpy.ma' arrays; they are passed to gnuplot using its 'set
+    datafile missing' mechanism.
+
  o  Should work under Unix, Macintosh, and Windows.
 
 Restrictions:
@@ -140,9 +175,6 @@ Restrictions:
         g('set style data linespoints')
         g('set pointsize 5')
 
- -  There is no provision for missing data points in array data (which
-    gnuplot allows via the 'set missing' command).
-
 Bugs:
 
  -  No attempt is made to check for errors reported by gnuplot.  On
@@ -152,22 +184,26 @@ Bugs:
  -  All of these classes perform their resource deallocation when
     '__del__' is called.  Normally this works fine, but there are
     well-known cases when Python's automatic resource deallocation
-    fails, which can leave temporary files around.
+    fails.  Temporary files are then still deleted when their Gnuplot
+    object is closed or Python exits.
 
 """
 
 __version__ = '0.1'
 
 from .gp import GnuplotOpts, GnuplotProcess, test_persist
-from .errors import Error, OptionError, DataError
-from .plotitems import PlotItem, Func, File, Data, GridData
+from .errors import Error, OptionError, DataError, DataCopyWarning
+from .plotitems import PlotItem, Func, File, NpyFile, Data, GridData
+from .plotitems import StreamingData, RingBufferData
 from ._gnuplot import Gnuplot
 
 # Other modules that should be loaded for 'from gnuplot import *':
-__all__ = ['utils', 'funcutils',
+__all__ = ['utils', 'funcutils', 'datacache', 'fifopool', 'tempdirs',
+           'transports', 'calibration',
            'GnuplotOpts', 'GnuplotProcess', 'test_persist',
-           'Error', 'OptionError', 'DataError',
-           'PlotItem', 'Func', 'File', 'Data', 'GridData',
+           'Error', 'OptionError', 'DataError', 'DataCopyWarning',
+           'PlotItem', 'Func', 'File', 'NpyFile', 'Data', 'GridData',
+           'StreamingData', 'RingBufferData',
            'Gnuplot']
 
 if __name__ == '__main__':
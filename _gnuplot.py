@@ -12,9 +12,11 @@ interface to a running gnuplot process.
 """
 
 import sys
+from collections import deque
+from contextlib import contextmanager
 
 from . import gp, plotitems
-from . import termdefs, errors
+from . import termdefs, errors, fifopool, tempdirs
 
 
 class _GnuplotFile:
@@ -38,6 +40,8 @@ class _GnuplotFile:
 
         'write' -- write an arbitrary string to the file.
 
+        'write_bytes' -- write raw bytes to the file.
+
         'flush' -- cause pending output to be written immediately.
 
     """
@@ -50,6 +54,12 @@ class _GnuplotFile:
         self.write = self.gnuplot.write
         self.flush = self.gnuplot.flush
 
+    def write_bytes(self, b):
+        """Write raw bytes (e.g., inline data) to the file."""
+
+        self.gnuplot.flush()
+        self.gnuplot.buffer.write(b)
+
     def __call__(self, s):
         """Write a command string to the file, followed by newline."""
 
@@ -62,6 +72,26 @@ class _GnuplotFile:
             self.gnuplot = None
 
 
+def _range_limits(limits):
+    """Return the numerical values of range limits, or None for each.
+
+    'limits' is a pair of numbers, strings (e.g., '*' or '2*pi'), or
+    None.  Only limits that are numbers (or strings holding numbers)
+    are converted.
+
+    """
+
+    if len(limits) != 2:
+        return (None, None)
+    values = []
+    for limit in limits:
+        try:
+            values.append(float(limit))
+        except (TypeError, ValueError):
+            values.append(None)
+    return tuple(values)
+
+
 class Gnuplot:
     """Interface to a gnuplot program.
 
@@ -80,6 +110,12 @@ class Gnuplot:
         'plotcmd' -- 'plot' or 'splot', depending on what was the last
             plot command.
 
+        'ranges' -- a dictionary mapping the range options set by
+            'set_range' (e.g., 'xrange') to tuples '(min, max)' of
+            their numerical limits, with None for limits that are
+            autoscaled or not numbers.  PlotItems can use this to send
+            only the data that will be visible.
+
     Methods:
 
         '__init__' -- if a filename argument is specified, the
@@ -105,9 +141,20 @@ class Gnuplot:
         'refresh' -- issue (or reissue) the plot command using the
             current 'PlotItems'.
 
+        'fifos' -- return the 'FIFOManager' through which FIFO-based
+            PlotItems send their data to this gnuplot (see 'fifopool').
+
+        'tempdir' -- return the 'TempDir' holding the temporary data
+            files of this session (see 'tempdirs'); e.g.,
+            'g.tempdir().usage()' tells how much disk space they use.
+
         '__call__' -- pass an arbitrary string to the gnuplot process,
             followed by a newline.
 
+        'batch' -- a context manager; the commands sent inside a
+            'with g.batch():' block are flushed to gnuplot together
+            when the block ends instead of one by one.
+
         'xlabel', 'ylabel', 'zlabel', 'title' -- set corresponding plot
             attribute.
 
@@ -156,7 +203,7 @@ class Gnuplot:
         'output': 'string',
         }
 
-    def __init__(self, filename=None, persist=None, debug=0):
+    def __init__(self, filename=None, persist=None, debug=0, process=None):
         """Create a Gnuplot object.
 
         Create a 'Gnuplot' object.  By default, this starts a gnuplot
@@ -176,9 +223,32 @@ class Gnuplot:
           'debug=1' -- echo the gnuplot commands to stderr as well as
               sending them to gnuplot.
 
+          'process=<object>' -- send the commands to this object
+              instead, which must have the interface of
+              'gp.GnuplotProcess' (e.g., a gnuplot process started
+              in some other way).  It is closed with the Gnuplot
+              object.
+
         """
 
-        if filename is None:
+        # (Set first, for close() if an option is rejected:)
+        self.gnuplot = None
+        self._fifos = None
+        self._tempdir = None
+        # The depth of nested batch() blocks, and the number of bytes
+        # of commands written in them but not flushed yet:
+        self._batch = 0
+        self._batched = 0
+        # Datablocks to be deleted before the next command (see
+        # '_undefine_later()'):
+        self._undefine = deque()
+        if process is not None:
+            if filename is not None or persist is not None:
+                raise errors.OptionError(
+                    'Gnuplot with a given process does not allow '
+                    'filename or persist options.')
+            self.gnuplot = process
+        elif filename is None:
             self.gnuplot = gp.GnuplotProcess(persist=persist)
         else:
             if persist is not None:
@@ -191,7 +261,9 @@ class Gnuplot:
         self.debug = debug
         self.plotcmd = 'plot'
         self.itemlist = []
+        self.ranges = {}
         self('set terminal %s' % (gp.GnuplotOpts.default_term,))
+        self._set_missing()
 
     def close(self):
         # This may cause a wait for the gnuplot process to finish
@@ -201,6 +273,15 @@ class Gnuplot:
             # close was not defined in _gnuplot.Gnuplot
             self.gnuplot.close()
             self.gnuplot = None
+        if self._fifos is not None:
+            # Release any FIFO writers that gnuplot left waiting:
+            self._fifos.close()
+            self._fifos = None
+        if self._tempdir is not None:
+            # Gnuplot has exited (closing the pipe waits for it), so
+            # it is done reading the files:
+            self._tempdir.close()
+            self._tempdir = None
 
     def __del__(self):
         self.close()
@@ -211,15 +292,74 @@ class Gnuplot:
 
         Send the string s as a command to gnuplot, followed by a
         newline.  All communication with the gnuplot process (except
-        for inline data) is through this method.
+        for inline data) is through this method.  Inside a 'batch()'
+        block the command is only written, not flushed.
 
         """
+
+        while self._undefine:
+            self._send('undefine %s' % (self._undefine.popleft(),))
+        self._send(s)
+
+    def _send(self, s):
         if self.debug:
             # also echo to stderr for user to see:
             sys.stderr.write('gnuplot> %s\n' % (s,))
             sys.stderr.flush()
 
-        self.gnuplot(s)
+        if self._batch:
+            self.gnuplot.write(s + '\n')
+            self._batched += len(s) + 1
+            if self._batched >= gp.GnuplotOpts.batch_flush_bytes:
+                self._flush()
+        else:
+            self.gnuplot(s)
+
+    def _flush(self):
+        if self.gnuplot is not None:
+            self.gnuplot.flush()
+        self._batched = 0
+
+    def _undefine_later(self, name):
+        """Delete the datablock 'name' before the next command is sent.
+
+        This is used when a datablock item is garbage-collected, which
+        can happen at any time, e.g., while inline data are being sent;
+        writing 'undefine' to gnuplot right then would corrupt them.
+
+        """
+
+        self._undefine.append(name)
+
+    @contextmanager
+    def batch(self):
+        """Send the commands of a 'with' block to gnuplot all at once.
+
+        Normally each command is flushed to gnuplot as soon as it is
+        sent, which costs a write to the pipe (and a wakeup of gnuplot)
+        per command.  Inside a 'with g.batch():' block, commands are
+        collected in the buffer of the pipe and flushed when the block
+        ends, even if it ends with an exception, or whenever
+        gp.GnuplotOpts.batch_flush_bytes of them are pending.  Blocks
+        can be nested; only the outermost one flushes.  E.g.::
+
+            with g.batch():
+                g.set(xrange=(0, t), yrange=(-1, 1))
+                g.title('t = %g' % (t,))
+                g.plot(data)
+
+        Inline data still go to the pipe as they are sent, after
+        flushing the commands before them so that the order is kept.
+
+        """
+
+        self._batch += 1
+        try:
+            yield self
+        finally:
+            self._batch -= 1
+            if not self._batch:
+                self._flush()
 
     def refresh(self):
         """Refresh the plot, using the current 'PlotItem's.
@@ -229,14 +369,42 @@ class Gnuplot:
 
         """
 
-        plotcmds = []
-        for item in self.itemlist:
-            plotcmds.append(item.command())
-        self(self.plotcmd + ' ' + ', '.join(plotcmds))
-        for item in self.itemlist:
-            # Uses self.gnuplot.write():
-            item.pipein(self.gnuplot)
-        self.gnuplot.flush()
+        # (The batch flushes the plot command and data at the end:)
+        with self.batch():
+            for item in self.itemlist:
+                # e.g., send datablocks:
+                item.prepare(self)
+            plotcmds = []
+            for item in self.itemlist:
+                plotcmds.append(item.command())
+            self(self.plotcmd + ' ' + ', '.join(plotcmds))
+            for item in self.itemlist:
+                # Uses self.gnuplot.write():
+                item.pipein(self.gnuplot)
+
+    def fifos(self):
+        """Return the FIFOManager of this session, creating it if needed.
+
+        The FIFOs and the threads writing to them are cleaned up when
+        the Gnuplot object is closed.
+
+        """
+
+        if self._fifos is None:
+            self._fifos = fifopool.FIFOManager()
+        return self._fifos
+
+    def tempdir(self):
+        """Return the TempDir of this session, creating it if needed.
+
+        Temporary data files of the items plotted by this session are
+        moved there, and deleted when the Gnuplot object is closed.
+
+        """
+
+        if self._tempdir is None:
+            self._tempdir = tempdirs.TempDir()
+        return self._tempdir
 
     def _clear_queue(self):
         """Clear the 'PlotItems' from the queue."""
@@ -374,6 +542,14 @@ class Gnuplot:
 
         self('reset')
         self.itemlist = []
+        self.ranges = {}
+        self._set_missing()
+
+    def _set_missing(self):
+        """Tell gnuplot how missing values are written in data files."""
+
+        if gp.GnuplotOpts.missing_data is not None:
+            self.set_string('datafile missing', gp.GnuplotOpts.missing_data)
 
     def load(self, filename):
         """Load a file using gnuplot's 'load' command."""
@@ -438,11 +614,15 @@ class Gnuplot:
 
         if value is None:
             self('set %s [*:*]' % (option,))
+            self.ranges[option] = (None, None)
         elif isinstance(value, str):
             self('set %s %s' % (option, value,))
+            limits = value.strip('[] ').split(':')
+            self.ranges[option] = _range_limits(limits)
         else:
             # Must be a tuple:
             (minrange, maxrange) = value
+            self.ranges[option] = _range_limits((minrange, maxrange))
             if minrange is None:
                 minrange = '*'
             if maxrange is None:
@@ -454,12 +634,13 @@ class Gnuplot:
         The allowed settings and their treatments are determined from
         the optiontypes mapping."""
 
-        for (k, v) in keyw.items():
-            try:
-                optype = self.optiontypes[k]
-            except KeyError:
-                raise 'option %s is not supported' % (k,)
-            getattr(self, 'set_%s' % optype)(k, v)
+        with self.batch():
+            for (k, v) in keyw.items():
+                try:
+                    optype = self.optiontypes[k]
+                except KeyError:
+                    raise 'option %s is not supported' % (k,)
+                getattr(self, 'set_%s' % optype)(k, v)
 
     def xlabel(self, s=None, offset=None, font=None):
         """Set the plot's xlabel."""
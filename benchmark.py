@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""benchmark.py -- Measure how fast gnuplot_py3 serializes data.
+
+Run by typing 'python benchmark.py'.  Gnuplot itself is not needed;
+only the Python side of the data transfer is timed.
+
+"""
+
+import os, time
+from io import StringIO
+import numpy as np
+
+try:
+    import gnuplot.utils
+    utils = gnuplot.utils
+except ImportError:
+    # kludge in case gnuplot hasn't been installed as a module yet:
+    # load this directory as the package 'gnuplot'.
+    import sys, importlib.util
+    _here = os.path.dirname(os.path.abspath(__file__))
+    _spec = importlib.util.spec_from_file_location(
+        'gnuplot', os.path.join(_here, '__init__.py'),
+        submodule_search_locations=[_here])
+    gnuplot = importlib.util.module_from_spec(_spec)
+    sys.modules['gnuplot'] = gnuplot
+    _spec.loader.exec_module(gnuplot)
+    import gnuplot.utils
+    utils = gnuplot.utils
+
+
+def timeit(f, *args):
+    """Return the best wall-clock time of three calls to f(*args)."""
+
+    best = None
+    for i in range(3):
+        t0 = time.perf_counter()
+        f(*args)
+        t = time.perf_counter() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def report(name, points, seconds):
+    print('%-40s %12.0f rows/s  (%.3f s)' % (name, points / seconds, seconds))
+
+
+def loop_text(data):
+    f = StringIO()
+    utils.write_array(f, data)
+    return f.getvalue()
+
+
+def bench_text(points=200000, columns=3):
+    """Compare the per-row 'write_array' with the bulk serializer."""
+
+    data2 = np.random.rand(points, columns)
+    data3 = data2.reshape((points // 100, 100, columns))
+    data4 = data2.reshape((points // 500, 50, 10, columns))
+    print('Text serialization of %d points x %d columns:' % (points, columns))
+    report('write_array, 2-d', points, timeit(loop_text, data2))
+    report('format_array, 2-d', points, timeit(utils.format_array, data2))
+    report('write_array, 3-d (blocks of 100)',
+           points, timeit(loop_text, data3))
+    report('format_array, 3-d (blocks of 100)',
+           points, timeit(utils.format_array, data3))
+    report('write_array, 4-d (blocks of 10)',
+           points, timeit(loop_text, data4))
+    report('format_array, 4-d (blocks of 10)',
+           points, timeit(utils.format_array, data4))
+    for precision in [6, 9]:
+        report('format_array, 2-d, precision=%d' % (precision,),
+               points, timeit(utils.format_array, data2, precision))
+
+
+def grid_text(data, x, y):
+    return b''.join(utils.grid_chunks(x, y, data))
+
+
+def bench_grid(numx=500, numy=400):
+    """Time the text form of grid data (as written by GridData)."""
+
+    data = np.random.rand(numx, numy)
+    x = np.arange(numx, dtype=float)
+    y = np.arange(numy, dtype=float)
+    points = numx * numy
+    print('Text serialization of a %d x %d grid:' % (numx, numy))
+    report('grid_chunks', points, timeit(grid_text, data, x, y))
+
+
+def main():
+    bench_text()
+    bench_grid()
+
+
+# when executed, just run main():
+if __name__ == '__main__':
+    main()
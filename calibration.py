@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""calibration.py -- Measure which transport is fastest on this machine.
+
+How fast each way of sending data to gnuplot is (see 'transports')
+depends on the machine: the size of the pipe buffer, whether a tmpfs
+is available, how the local gnuplot was built.  'calibrate()' plots
+data of a few sizes with each transport against the local gnuplot
+(using its 'unknown' terminal, so nothing is drawn), measures how
+long gnuplot takes to read them, and stores the results in a small
+JSON file.  'transports.policy' reads that file when it first makes a
+choice and adjusts its thresholds to the measured numbers.
+
+Run 'python -m gnuplot.calibration' (e.g., after installing gnuplot
+or gnuplot_py3) to calibrate, or set
+gp.GnuplotOpts.auto_calibrate to calibrate when the policy is first
+used and no results are stored yet.
+
+"""
+
+import os, time, json, subprocess
+import numpy
+
+from . import gp, errors, tempdirs, _gnuplot, plotitems, transports
+
+
+class _TimedProcess:
+    """A GnuplotProcess that can wait for gnuplot to catch up.
+
+    Same interface as 'gp.GnuplotProcess', plus 'sync()', which
+    returns once gnuplot has executed all of the commands sent so far
+    (by asking gnuplot to print a marker to its stderr and waiting
+    for it).
+
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            gp.GnuplotOpts.gnuplot_command, shell=True,
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True,
+            )
+        self.gnuplot = self.process.stdin
+        self.write = self.gnuplot.write
+        self.flush = self.gnuplot.flush
+        self.syncs = 0
+
+    def write_bytes(self, b):
+        self.gnuplot.flush()
+        self.gnuplot.buffer.write(b)
+
+    def __call__(self, s):
+        self.write(s + '\n')
+        self.flush()
+
+    def sync(self):
+        self.syncs += 1
+        marker = 'gnuplot_py3 sync %d' % (self.syncs,)
+        self('print "%s"' % (marker,))
+        while True:
+            line = self.process.stderr.readline()
+            if not line:
+                raise errors.Error('gnuplot exited during calibration')
+            if line.strip() == marker:
+                return
+
+    def close(self):
+        if self.gnuplot is not None:
+            self.gnuplot.close()
+            self.process.wait()
+            self.gnuplot = None
+
+
+def _transports():
+    """Return the '(name, options)' of the transports to be measured.
+
+    Every option that selects a transport is given, so that neither
+    'transports.policy' nor the preferences in gp.GnuplotOpts change
+    what is measured.
+
+    """
+
+    def options(**keyw):
+        result = {
+            'transport': None, 'inline': 0, 'datablock': 0, 'fifo': 0,
+            'memory': 0, 'cache': 0, 'lazy': 0,
+            }
+        result.update(keyw)
+        return result
+
+    result = [
+        ('inline text', options(inline=1, binary=0)),
+        ('text file', options(binary=0)),
+        ]
+    if gp.GnuplotOpts.recognizes_binary_data:
+        result.append(('binary file', options(binary=1)))
+        if tempdirs.memory_available(0):
+            result.append(('binary memory file', options(binary=1, memory=1)))
+    if gp.GnuplotOpts.support_fifo:
+        result.append(('text fifo', options(fifo=1, binary=0)))
+        if gp.GnuplotOpts.recognizes_binary_data:
+            result.append(('binary fifo', options(fifo=1, binary=1)))
+    return result
+
+
+def _best(f, repeats):
+    best = None
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        f()
+        t = time.perf_counter() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def measure(sizes=(1000, 10000, 100000, 1000000), columns=2, repeats=2):
+    """Time each transport for data of 'sizes' points of 'columns' values.
+
+    Return a dictionary mapping the name of each transport to a
+    dictionary mapping each size (as a string) to the best times (in
+    seconds) for plotting the data once ('plot') and for replotting
+    them ('replot').
+
+    """
+
+    # Talk to a real gnuplot, whose progress can be followed:
+    process = _TimedProcess()
+    g = _gnuplot.Gnuplot(process=process)
+    g('set terminal unknown')
+    g._set_missing()
+    results = {}
+    try:
+        for (name, options) in _transports():
+            times = {}
+            for points in sizes:
+                data = numpy.random.rand(points, columns)
+
+                def plot():
+                    g.plot(plotitems.Data(data, **options))
+                    process.sync()
+
+                def replot():
+                    g.replot()
+                    process.sync()
+
+                times[str(points)] = {
+                    'plot': _best(plot, repeats),
+                    'replot': _best(replot, repeats),
+                    }
+            results[name] = times
+    finally:
+        g.close()
+    return results
+
+
+def thresholds(results, columns=2):
+    """Derive the settings of a TransportPolicy from measured 'results'.
+
+    'inline_max_bytes' is set to the estimated text size of the
+    biggest data for which inline text was the fastest way (within
+    10%) of plotting once, or 0 if it never was.
+    'fifo_for_single_plots' is set according to whether a FIFO beat
+    a file for the biggest data.
+
+    """
+
+    policy = transports.TransportPolicy()
+    settings = {'inline_max_bytes': 0}
+    inline = results.get('inline text', {})
+    for (size, times) in sorted(inline.items(), key=lambda i: int(i[0])):
+        fastest = min([t[size]['plot'] for t in results.values()
+                       if size in t])
+        if times['plot'] <= 1.1 * fastest:
+            settings['inline_max_bytes'] = policy.text_bytes(
+                numpy.zeros((int(size), columns)))
+
+    for form in ['binary', 'text']:
+        fifo = results.get('%s fifo' % (form,))
+        files = [results[name] for name in ['%s file' % (form,),
+                                            '%s memory file' % (form,)]
+                 if name in results]
+        if fifo and files:
+            size = max(fifo, key=int)
+            settings['fifo_for_single_plots'] = (
+                fifo[size]['plot'] <= min([f[size]['plot'] for f in files]))
+            break
+    return settings
+
+
+def calibrate(sizes=(1000, 10000, 100000, 1000000), columns=2, repeats=2,
+              filename=None):
+    """Measure the transports, store the results and return them.
+
+    The results are written as JSON to 'filename' (by default
+    'transports.calibration_filename()'), and the settings derived
+    from them are applied to 'transports.policy'.
+
+    """
+
+    results = measure(sizes, columns, repeats)
+    calibration = {
+        'gnuplot_command': gp.GnuplotOpts.gnuplot_command,
+        'gnuplot_version': list(transports.gnuplot_version()),
+        'created': time.time(),
+        'columns': columns,
+        'measurements': results,
+        'policy': thresholds(results, columns),
+        }
+    if filename is None:
+        filename = transports.calibration_filename()
+    if filename:
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(calibration, f, indent=1, sort_keys=True)
+    transports.policy.configure(calibration['policy'])
+    return calibration
+
+
+def main():
+    calibration = calibrate()
+    print('gnuplot %d.%d' % tuple(calibration['gnuplot_version']))
+    for (name, times) in sorted(calibration['measurements'].items()):
+        for (size, t) in sorted(times.items(), key=lambda i: int(i[0])):
+            print('%-20s %9s points: plot %8.4f s, replot %8.4f s'
+                  % (name, size, t['plot'], t['replot']))
+    print('policy settings: %s' % (calibration['policy'],))
+    print('written to %s' % (transports.calibration_filename(),))
+
+
+# when executed, just run main():
+if __name__ == '__main__':
+    main()
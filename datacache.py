@@ -0,0 +1,185 @@
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""datacache.py -- Share temporary data files between identical datasets.
+
+Programs that rebuild their PlotItems for every plot from the same
+arrays would otherwise format and write the same data to a new
+temporary file each time.  A 'DataCache' keeps the temporary files
+that it has written, indexed by a hash of the data and of the options
+that affect the contents of the file, and hands out an existing file
+instead of writing a new one whenever the same data are plotted
+again.
+
+Files that are no longer used by any PlotItem are kept until the
+cache grows beyond its limits, then deleted in least-recently-used
+order.  Files that are still in use are never deleted (but they count
+towards the limits).
+
+"""
+
+import os, hashlib, threading, atexit
+from collections import OrderedDict
+
+from . import gp, utils, tempdirs
+
+
+def data_key(arrays, *options):
+    """Return a cache key for data generated from 'arrays' with 'options'.
+
+    The key is made of the shapes and types of the arrays, the options
+    (which must have stable 'repr()'s), and a hash of the contents of
+    the arrays.  The arrays are hashed a block at a time, without
+    making copies of them.
+
+    """
+
+    h = hashlib.blake2b(digest_size=20)
+    shapes = []
+    for data in arrays:
+        shapes.append((data.shape, data.dtype.str))
+        for chunk in utils.binary_chunks(data):
+            h.update(chunk)
+    return repr((tuple(shapes),) + options) + h.hexdigest()
+
+
+class _Entry:
+    """A file held by a DataCache."""
+
+    def __init__(self, filename, size):
+        self.filename = filename
+        self.size = size
+        self.refs = 0
+
+
+class DataCache:
+    """A least-recently-used cache of temporary data files.
+
+    Members:
+
+      'max_bytes' -- the total size of the files above which unused
+          files are deleted.  If None, the value of
+          gp.GnuplotOpts.data_cache_bytes is used.
+
+      'max_entries' -- the number of files above which unused files
+          are deleted.  If None, the value of
+          gp.GnuplotOpts.data_cache_entries is used.
+
+      'hits', 'misses', 'evictions' -- the number of times a file was
+          found in the cache, the number of times a file had to be
+          written, and the number of files that were deleted to keep
+          the cache within its limits.
+
+    """
+
+    def __init__(self, max_bytes=None, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key, write):
+        """Return the name of a file holding the data identified by 'key'.
+
+        If the cache has no such file, a new temporary file is created
+        and 'write(f)' is called to write the data to the file object
+        'f' (opened in binary mode).  Each call must be matched by a
+        call to 'release(key)' once the file is no longer needed.
+
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                (fd, filename) = tempdirs.default().mkstemp()
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        write(f)
+                        size = f.tell()
+                except:
+                    os.unlink(filename)
+                    raise
+                entry = _Entry(filename, size)
+                self._entries[key] = entry
+                self._bytes += size
+                self.misses += 1
+            entry.refs += 1
+            self._evict()
+            return entry.filename
+
+    def release(self, key):
+        """Declare that one user of the file for 'key' is done with it."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs -= 1
+                self._evict()
+
+    def _evict(self):
+        """Delete unused files until the cache is within its limits."""
+
+        max_bytes = self.max_bytes
+        if max_bytes is None:
+            max_bytes = gp.GnuplotOpts.data_cache_bytes
+        max_entries = self.max_entries
+        if max_entries is None:
+            max_entries = gp.GnuplotOpts.data_cache_entries
+
+        if self._bytes <= max_bytes and len(self._entries) <= max_entries:
+            return
+        for (key, entry) in list(self._entries.items()):
+            if self._bytes <= max_bytes and len(self._entries) <= max_entries:
+                break
+            if entry.refs <= 0:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        try:
+            os.unlink(entry.filename)
+        except OSError:
+            pass
+
+    def clear(self):
+        """Delete all of the files that are not in use."""
+
+        with self._lock:
+            for (key, entry) in list(self._entries.items()):
+                if entry.refs <= 0:
+                    self._remove(key)
+
+    def stats(self):
+        """Return a dictionary of statistics about the cache."""
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                }
+
+    def close(self):
+        """Delete all of the files, including those still in use."""
+
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+
+# The cache used by Data and GridData:
+cache = DataCache()
+atexit.register(cache.close)
@@ -4,7 +4,7 @@
 # This file is licensed under the GNU Lesser General Public License
 # (LGPL).  See LICENSE.txt for details.
 
-"""Exception types that can be raised by Gnuplot.py."""
+"""Exception and warning types that can be raised by Gnuplot.py."""
 
 
 class Error(Exception):
@@ -22,3 +22,6 @@ class DataError(Error):
     pass
 
 
+class DataCopyWarning(UserWarning):
+    """Issued when a data array has to be copied before it is plotted"""
+    pass
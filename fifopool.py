@@ -0,0 +1,300 @@
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""fifopool.py -- Send data to gnuplot through reusable FIFOs.
+
+A FIFO (named pipe) lets gnuplot read data as if from a file while
+Python writes it, without the data ever touching the disk.  Writing
+to a FIFO blocks until gnuplot opens it for reading, so the writing
+has to be done outside of the main thread.
+
+A 'FIFOManager' owns a private temporary directory holding the FIFOs
+of one Gnuplot session and a small pool of threads that do the
+writing.  Each PlotItem gets one FIFO, which is reused every time the
+item is plotted; the writes are queued in the order in which gnuplot
+will read them.  A writer whose FIFO gnuplot never opens (e.g., after
+an error in the plot command) is released when its item is deleted;
+until then, it does not hold up the writes queued after it, for which
+extra threads are started.  When the manager is closed, any writer
+still waiting for gnuplot is released and the FIFOs and their
+directory are removed.  The directory is created by 'tempdirs', so
+that it is swept like the directories of temporary data files if its
+process dies without closing the manager.
+
+This module depends on os.mkfifo(), which only exists under Unix.
+
+"""
+
+import os, threading, queue, itertools, weakref, atexit
+
+from . import gp, tempdirs
+
+
+class _FIFO:
+    """The state of one FIFO of a FIFOManager."""
+
+    def __init__(self):
+        self.lock = threading.Lock()   # held while writing to the FIFO
+        self.pending = 0               # number of writes queued or active
+        self.active = 0                # is a writer opening or writing it?
+        self.waiting = 0               # is a writer waiting in open()?
+        self.released = 0              # remove the FIFO when it is idle?
+
+
+class FIFOManager:
+    """A set of FIFOs and a pool of threads that write data to them.
+
+    Members:
+
+        'dirname' -- the directory holding the FIFOs.
+
+        'max_workers' -- the number of writer threads that are kept.
+            Writers wait (in a thread) until gnuplot reads their FIFO,
+            so several of them let data be queued for FIFOs that
+            gnuplot is not ready to read yet.  If all of them are
+            waiting when a write is queued, another thread is started
+            for it, which exits once it is idle.  If None, the value
+            of gp.GnuplotOpts.fifo_workers is used.
+
+    """
+
+    def __init__(self, max_workers=None):
+        # (A directory of tempdirs, so that it is swept if it is left
+        # behind:)
+        (self.dirname, self._lockfd) = tempdirs.mkdtemp(suffix='.fifos')
+        self.max_workers = max_workers
+        self.closed = 0
+        self._fifos = {}
+        self._items = weakref.WeakKeyDictionary()
+        self._names = itertools.count()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._idle = 0          # threads waiting for a job
+        self._unclaimed = 0     # jobs queued with no thread to do them
+        self._waiting = 0       # threads waiting for gnuplot in open()
+        self._lock = threading.Lock()
+
+    def fifo(self, item):
+        """Return the name of the FIFO for 'item', creating it if needed.
+
+        The FIFO is removed once 'item' has been deleted and all of the
+        data queued for it have been read.
+
+        """
+
+        with self._lock:
+            filename = self._items.get(item)
+            if filename is None:
+                filename = os.path.join(
+                    self.dirname, 'fifo%d' % (next(self._names),))
+                os.mkfifo(filename)
+                self._fifos[filename] = _FIFO()
+                self._items[item] = filename
+                weakref.finalize(item, self.release, filename)
+            return filename
+
+    def send(self, filename, write):
+        """Queue a write to the FIFO 'filename'.
+
+        'write(f)' is called in a writer thread, with the FIFO open for
+        writing in binary mode as 'f', once gnuplot opens the FIFO for
+        reading.  Writes are started in the order in which they are
+        queued, and writes to the same FIFO never overlap.
+
+        """
+
+        with self._lock:
+            if self.closed:
+                raise ValueError('FIFOManager is closed')
+            self._fifos[filename].pending += 1
+            # Retry releasing writers whose item is gone (a writer
+            # may not have been in open() yet when it was released):
+            for (name, fifo) in self._fifos.items():
+                if fifo.released and fifo.waiting:
+                    _unblock(name)
+            if self._idle:
+                self._idle -= 1
+            elif len(self._threads) < self._max_workers():
+                self._start()
+            else:
+                self._unclaimed += 1
+                self._start_if_stuck()
+        self._queue.put((filename, write))
+
+    def _start(self):
+        thread = threading.Thread(
+            target=self._work, name='FIFO writer for %s' % (self.dirname,))
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _start_if_stuck(self):
+        # If every writer is waiting for gnuplot, which may never open
+        # their FIFOs, start another one for the jobs queued after them:
+        if self._unclaimed and self._waiting >= len(self._threads):
+            self._unclaimed -= 1
+            self._start()
+
+    def _max_workers(self):
+        if self.max_workers is None:
+            return gp.GnuplotOpts.fifo_workers
+        return self.max_workers
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            (filename, write) = job
+            fifo = self._fifos[filename]
+            with fifo.lock:
+                if not self.closed:
+                    fifo.active = 1
+                    try:
+                        f = self._open(filename, fifo)
+                        if f is not None:
+                            with f:
+                                write(f)
+                    except OSError:
+                        # gnuplot stopped reading (or we were closed):
+                        pass
+                    fifo.active = 0
+            # Don't keep the item alive while waiting for the next job:
+            del job, write
+            with self._lock:
+                fifo.pending -= 1
+                if fifo.released and not fifo.pending:
+                    self._remove(filename)
+                if self._unclaimed:
+                    self._unclaimed -= 1
+                elif self.closed or len(self._threads) > self._max_workers():
+                    # An extra thread (or close() is waiting for us):
+                    thread = threading.current_thread()
+                    if thread in self._threads:
+                        self._threads.remove(thread)
+                    return
+                else:
+                    self._idle += 1
+
+    def _open(self, filename, fifo):
+        """Open FIFO 'filename' for writing once gnuplot opens it too.
+
+        Return None if the FIFO has been released and gnuplot is not
+        reading it, in which case nobody will.
+
+        """
+
+        with self._lock:
+            if fifo.released:
+                try:
+                    fd = os.open(filename, os.O_WRONLY | os.O_NONBLOCK)
+                except OSError:
+                    return None
+                os.set_blocking(fd, True)
+                return open(fd, 'wb')
+            fifo.waiting = 1
+            self._waiting += 1
+            self._start_if_stuck()
+        try:
+            return open(filename, 'wb')
+        finally:
+            with self._lock:
+                fifo.waiting = 0
+                self._waiting -= 1
+
+    def release(self, filename):
+        """Remove the FIFO 'filename' once all queued data have been read.
+
+        A writer that is still waiting for gnuplot to open the FIFO is
+        released (its data are dropped); writes queued for the FIFO
+        after it are only done if gnuplot is reading it already.
+
+        """
+
+        with self._lock:
+            fifo = self._fifos.get(filename)
+            if fifo is not None:
+                fifo.released = 1
+                if not fifo.pending:
+                    self._remove(filename)
+                elif fifo.waiting:
+                    # gnuplot has not opened the FIFO for a plot command
+                    # that has gone (e.g., because of an error in it):
+                    _unblock(filename)
+
+    def _remove(self, filename):
+        del self._fifos[filename]
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+    def close(self):
+        """Stop the writers and remove the FIFOs and their directory.
+
+        Writers that are still waiting for gnuplot to read their FIFO
+        are released by opening the FIFO for reading and closing it
+        again, which makes their writes fail.
+
+        """
+
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = 1
+            threads = self._threads
+            self._threads = []
+        for thread in threads:
+            self._queue.put(None)
+        for thread in threads:
+            while thread.is_alive():
+                for (filename, fifo) in list(self._fifos.items()):
+                    if fifo.active:
+                        _unblock(filename)
+                thread.join(0.01)
+        for filename in list(self._fifos):
+            self._remove(filename)
+        if self._lockfd is not None:
+            try:
+                os.unlink(os.path.join(self.dirname, tempdirs.lockname))
+            except OSError:
+                pass
+            os.close(self._lockfd)
+            self._lockfd = None
+        try:
+            os.rmdir(self.dirname)
+        except OSError:
+            pass
+
+    def __del__(self):
+        self.close()
+
+
+def _unblock(filename):
+    """Release a writer waiting for a reader of FIFO 'filename'."""
+
+    try:
+        fd = os.open(filename, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        pass
+    else:
+        os.close(fd)
+
+
+_default_manager = None
+
+
+def default_manager():
+    """Return the FIFOManager used for items plotted outside a session.
+
+    It is created when first needed and closed at exit.
+
+    """
+
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = FIFOManager()
+        atexit.register(_default_manager.close)
+    return _default_manager
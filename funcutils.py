@@ -14,8 +14,8 @@ points and tabulate the output to be used with Gnuplot.
 """
 
 import numpy
-import gnuplot
-import utils
+
+from . import utils, plotitems
 
 
 def tabulate_function(f, xvals, yvals=None, dtype=None, ufunc=0):
@@ -123,12 +123,12 @@ def compute_Data(xvals, f, ufunc=0, **keyw):
 
     """
 
-    xvals = utils.float_array(xvals)
+    xvals = utils.float_array(xvals, integer=0)
 
     # evaluate function:
     data = tabulate_function(f, xvals, ufunc=ufunc)
 
-    return gnuplot.Data(xvals, data, **keyw)
+    return plotitems.Data(xvals, data, **keyw)
 
 
 def compute_GridData(xvals, yvals, f, ufunc=0, **keyw):
@@ -168,10 +168,10 @@ def compute_GridData(xvals, yvals, f, ufunc=0, **keyw):
 
     """
 
-    xvals = utils.float_array(xvals)
-    yvals = utils.float_array(yvals)
+    xvals = utils.float_array(xvals, integer=0)
+    yvals = utils.float_array(yvals, integer=0)
 
     # evaluate function:
     data = tabulate_function(f, xvals, yvals, ufunc=ufunc)
 
-    return gnuplot.GridData(data, xvals, yvals, **keyw)
+    return plotitems.GridData(data, xvals, yvals, **keyw)
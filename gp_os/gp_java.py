@@ -37,9 +37,32 @@ class GnuplotOpts:
     recognizes_persist = 1
     prefer_persist = 0
     recognizes_binary_splot = 1
+    recognizes_binary_data = 1
     prefer_inline_data = 0
+    prefer_streaming_data = 0
+    default_precision = None
+    missing_data = '?'
+    prefer_cached_data = 0
+    data_cache_bytes = 256 * 1024 * 1024
+    data_cache_entries = 100
+    prefer_lazy_data = 0
+    lazy_data_keep_bytes = 16 * 1024 * 1024
+    prefer_memory_data = 0
+    memory_data_dir = None
+    memory_data_bytes = 256 * 1024 * 1024
+    recognizes_datablocks = 1
+    prefer_datablock_data = 0
+    default_decimation = None
+    decimate_width = 2000
+    sweep_temp_dirs = 0
     support_fifo = 0
     prefer_fifo_data = 0
+    fifo_workers = 4
+    default_transport = None
+    gnuplot_version = None
+    calibration_file = None
+    auto_calibrate = 0
+    batch_flush_bytes = 4096
     default_term = 'x11'
     default_lpr = '| lpr'
     prefer_enhanced_postscript = 1
@@ -94,6 +117,8 @@ class GnuplotProcess:
 
         'write' -- pass an arbitrary string to the gnuplot program.
 
+        'write_bytes' -- pass raw bytes to the gnuplot program.
+
         'flush' -- cause pending output to be written immediately.
 
     """
@@ -157,6 +182,9 @@ class GnuplotProcess:
     def write(self, s):
         self.gnuplot.write(s)
 
+    def write_bytes(self, b):
+        self.gnuplot.write(b)
+
     def flush(self):
         self.gnuplot.flush()
 
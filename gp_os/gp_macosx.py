@@ -32,12 +32,35 @@ class GnuplotOpts:
     recognizes_persist = None   # test automatically on first use
     prefer_persist = 0
     recognizes_binary_splot = 1
+    recognizes_binary_data = 1
     prefer_inline_data = 0
+    prefer_streaming_data = 0
+    default_precision = None
+    missing_data = '?'
+    prefer_cached_data = 0
+    data_cache_bytes = 256 * 1024 * 1024
+    data_cache_entries = 100
+    prefer_lazy_data = 0
+    lazy_data_keep_bytes = 16 * 1024 * 1024
+    prefer_memory_data = 0
+    memory_data_dir = None
+    memory_data_bytes = 256 * 1024 * 1024
+    recognizes_datablocks = 1
+    prefer_datablock_data = 0
+    default_decimation = None
+    decimate_width = 2000
+    sweep_temp_dirs = 1
 
     # os.mkfifo should be supported on Mac OS X.  Let me know if I'm
     # wrong.
     support_fifo = 1
     prefer_fifo_data = 1
+    fifo_workers = 4
+    default_transport = None
+    gnuplot_version = None
+    calibration_file = None
+    auto_calibrate = 0
+    batch_flush_bytes = 4096
 
     default_term = 'aqua'
     default_lpr = '| lpr'
@@ -90,6 +113,8 @@ class GnuplotProcess:
 
         'write' -- pass an arbitrary string to the gnuplot program.
 
+        'write_bytes' -- pass raw bytes to the gnuplot program.
+
         'flush' -- cause pending output to be written immediately.
 
         'close' -- close the connection to gnuplot.
@@ -135,6 +160,14 @@ class GnuplotProcess:
     def __del__(self):
         self.close()
 
+    def write_bytes(self, b):
+        """Pass raw bytes (e.g., data) to the gnuplot program."""
+
+        # Flush the text layer first so that the bytes stay in order
+        # with any commands written before them:
+        self.gnuplot.flush()
+        self.gnuplot.buffer.write(b)
+
     def __call__(self, s):
         """Send a command string to gnuplot, followed by newline."""
 
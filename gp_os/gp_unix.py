@@ -14,6 +14,7 @@ interfaces.
 
 """
 
+import os
 from os import popen
 
 # ############ Configuration variables: ################################
@@ -67,6 +68,14 @@ class GnuplotOpts:
     # demo uses binary=0 to maximize portability.)
     recognizes_binary_splot = 1
 
+    # Gnuplot 4.2 and later can also read general binary data, where
+    # each data point is a record of raw numbers described by a
+    # `binary record=<n> format=<fmt>' option.  'Data(..., binary=1)'
+    # uses this to avoid formatting the data as text, even for inline
+    # data.  Set this to 0 if your version of gnuplot does not
+    # support it.
+    recognizes_binary_data = 1
+
     # Data can be passed to gnuplot through a temporary file or as
     # inline data (i.e., the filename is set to '-' and the data is
     # entered into the gnuplot interpreter followed by 'e').  If
@@ -76,6 +85,90 @@ class GnuplotOpts:
     # big string when the PlotItem is created.
     prefer_inline_data = 0
 
+    # Inline and FIFO data items normally format their data once, when
+    # they are created, and keep the result until they are deleted.
+    # If prefer_streaming_data is true, they instead keep only the
+    # data array and format it chunk by chunk, straight into the pipe,
+    # each time they are plotted.  This keeps memory use low for big
+    # datasets, at the cost of reformatting the data for each plot.
+    # (Can be overridden with the 'stream' option of Data and
+    # GridData.)
+    prefer_streaming_data = 0
+
+    # Number of significant digits used when data are written to
+    # gnuplot as text (e.g., 6 writes 3.14159).  Fewer digits mean less
+    # text to format, transfer and parse.  None writes every number
+    # with as many digits as needed to represent it exactly.  (Can be
+    # overridden with the 'precision' option of Data and GridData.)
+    default_precision = None
+
+    # Missing data (NaNs or masked values in the arrays passed to
+    # Data and GridData) are written to text data files as the
+    # following string, and each Gnuplot object tells gnuplot about it
+    # with `set datafile missing'.  Set to None to write NaNs as `nan'
+    # and leave gnuplot's setting alone.
+    missing_data = '?'
+
+    # Temporary data files can be taken from a cache that is shared by
+    # all items plotting the same data with the same options, so that
+    # rebuilding identical Data or GridData items does not format and
+    # write the data again.  If prefer_cached_data is true, Data and
+    # GridData use the cache by default (can be overridden with their
+    # 'cache' option).  Files no longer used by any item are deleted,
+    # least recently used first, once the cache holds more than
+    # data_cache_bytes bytes or data_cache_entries files.
+    prefer_cached_data = 0
+    data_cache_bytes = 256 * 1024 * 1024
+    data_cache_entries = 100
+
+    # If prefer_lazy_data is true, Data and GridData items keep only a
+    # reference to the data array and format the data when they are
+    # first plotted (can be overridden with their 'lazy' option).
+    # Inline and FIFO items then keep the formatted data for later
+    # plots if it takes no more than lazy_data_keep_bytes bytes (None
+    # for no limit), and otherwise format it again for every plot.
+    prefer_lazy_data = 0
+    lazy_data_keep_bytes = 16 * 1024 * 1024
+
+    # Temporary data files can be kept in memory rather than on disk
+    # (the 'memory' option of Data and GridData; prefer_memory_data
+    # sets its default).  memory_data_dir is the tmpfs directory in
+    # which they are created, or 'memfd' to use anonymous memory files
+    # (os.memfd_create, Linux only), or None to always use the disk.
+    # Files that would take the memory used by data files beyond
+    # memory_data_bytes are written to disk instead.
+    prefer_memory_data = 0
+    memory_data_dir = '/dev/shm'
+    memory_data_bytes = 256 * 1024 * 1024
+
+    # Gnuplot 5.0 and later can store data in named datablocks
+    # (`$name << EOD').  Text data sent as a datablock are sent only
+    # once per Gnuplot object; replots and hardcopies just refer to
+    # the datablock by name.  Set recognizes_datablocks to 0 if your
+    # version of gnuplot does not support them.  If
+    # prefer_datablock_data is true, Data and GridData send text data
+    # as datablocks by default (can be overridden with their
+    # 'datablock' option).
+    recognizes_datablocks = 1
+    prefer_datablock_data = 0
+
+    # Data with many more points than the plot has pixels can be
+    # decimated before they are sent to gnuplot, keeping only the
+    # points that make a visible difference in a plot decimate_width
+    # pixels wide.  default_decimation is the method used by default
+    # ('minmax', 'lttb', or None for no decimation; can be overridden
+    # with the 'decimate' option of Data).
+    default_decimation = None
+    decimate_width = 2000
+
+    # Temporary data files and FIFOs are kept in private directories that
+    # are deleted when their Gnuplot session is closed or Python exits
+    # (see tempdirs.py).  If sweep_temp_dirs is set, directories left
+    # behind by processes that have died are deleted when gnuplot_py3
+    # is imported.  This needs os.kill(pid, 0) to check whether a
+    # process exists, which only works under Unix-like systems.
+    sweep_temp_dirs = 1
+
     # Does Python implement the threading module and os.mkfifo on this
     # operating system?  If so, the _FIFOFileItem class will be
     # defined in PlotItem.py.
@@ -84,6 +177,42 @@ class GnuplotOpts:
     # Should FIFOs be used to send data to gnuplot by default?
     prefer_fifo_data = 1
 
+    # The number of threads that write to FIFOs for each Gnuplot
+    # session.  A writer waits until gnuplot opens its FIFO, so more
+    # than one lets the data for several plot items be queued at once
+    # (and keeps later plots working if gnuplot skips an item, e.g.
+    # after an error in the plot command).  Extra threads are started
+    # while all of these are waiting, and exit once they are idle.
+    fifo_workers = 4
+
+    # If default_transport is 'auto', Data and GridData let
+    # transports.policy choose how their data are sent (inline, as a
+    # datablock, through a FIFO, or in a text or binary file on disk
+    # or in memory) from the size of the data and the features of
+    # gnuplot; None keeps the defaults given by the options above.
+    # (Can be overridden with their 'transport' option.)
+    default_transport = None
+
+    # The version of gnuplot, as a tuple (major, minor).  If None, it
+    # is found out by running 'gnuplot --version' when first needed.
+    gnuplot_version = None
+
+    # transports.policy reads its thresholds from the results of the
+    # calibration module (python -m gnuplot.calibration), stored as
+    # JSON in calibration_file (None means
+    # ~/.cache/gnuplot_py3/calibration.json; '' means no file).  If
+    # auto_calibrate is true and no results are stored for the local
+    # gnuplot, the calibration is run (which takes a few seconds) the
+    # first time the policy is used.
+    calibration_file = None
+    auto_calibrate = 0
+
+    # Inside a 'with g.batch():' block, commands are not flushed to
+    # gnuplot one by one but all together when the block ends.  So
+    # that gnuplot can start on a long batch early, the pending
+    # commands are flushed whenever they reach this many bytes.
+    batch_flush_bytes = 4096
+
     # After a hardcopy is produced, we have to set the terminal type
     # back to `on screen' using gnuplot's `set terminal' command.  The
     # following is the usual setting for Xwindows.  If it is wrong,
@@ -133,6 +262,20 @@ def test_persist():
     return GnuplotOpts.recognizes_persist
 
 
+def _copy_to_fd(f, fd, chunk=1024 * 1024):
+    """Copy the rest of the binary file object 'f' to file descriptor 'fd'."""
+
+    buf = bytearray(chunk)
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        written = 0
+        while written < n:
+            written += os.write(fd, view[written:n])
+
+
 class GnuplotProcess:
     """Unsophisticated interface to a running gnuplot program.
 
@@ -156,6 +299,13 @@ class GnuplotProcess:
 
         'write' -- pass an arbitrary string to the gnuplot program.
 
+        'write_bytes' -- pass raw bytes to the gnuplot program.
+
+        'write_file' -- pass the contents of a file to the gnuplot
+            program without copying them through Python.
+
+        'fileno' -- return the file descriptor of the pipe.
+
         'flush' -- cause pending output to be written immediately.
 
         'close' -- close the connection to gnuplot.
@@ -201,6 +351,47 @@ class GnuplotProcess:
     def __del__(self):
         self.close()
 
+    def write_bytes(self, b):
+        """Pass raw bytes (e.g., data) to the gnuplot program."""
+
+        # Flush the text layer first so that the bytes stay in order
+        # with any commands written before them:
+        self.gnuplot.flush()
+        self.gnuplot.buffer.write(b)
+
+    def fileno(self):
+        """Return the file descriptor of the pipe to gnuplot."""
+
+        return self.gnuplot.fileno()
+
+    def write_file(self, filename):
+        """Pass the contents of file 'filename' to the gnuplot program.
+
+        The data are moved from the file to the pipe by the kernel
+        (os.sendfile) where it can do that, and otherwise read into a
+        reused buffer and written to the pipe from there, so that even
+        large files are never copied into Python objects.
+
+        """
+
+        # Flush everything written before, so that the order is kept:
+        self.gnuplot.flush()
+        fd = self.fileno()
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(fd, f.fileno(), offset, size - offset)
+                    if not sent:
+                        break
+                    offset += sent
+            except (AttributeError, OSError):
+                # No sendfile, or it cannot write to pipes here:
+                pass
+            f.seek(offset)
+            _copy_to_fd(f, fd)
+
     def __call__(self, s):
         """Send a command string to gnuplot, followed by newline."""
 
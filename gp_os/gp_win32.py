@@ -41,15 +41,38 @@ class GnuplotOpts:
 
     # As far as I know, gnuplot under windows can use binary data:
     recognizes_binary_splot = 1
+    recognizes_binary_data = 1
 
     # Apparently gnuplot on windows can use inline data, but we use
     # non-inline data (i.e., temporary files) by default for no
     # special reason:
     prefer_inline_data = 0
+    prefer_streaming_data = 0
+    default_precision = None
+    missing_data = '?'
+    prefer_cached_data = 0
+    data_cache_bytes = 256 * 1024 * 1024
+    data_cache_entries = 100
+    prefer_lazy_data = 0
+    lazy_data_keep_bytes = 16 * 1024 * 1024
+    prefer_memory_data = 0
+    memory_data_dir = None
+    memory_data_bytes = 256 * 1024 * 1024
+    recognizes_datablocks = 1
+    prefer_datablock_data = 0
+    default_decimation = None
+    decimate_width = 2000
+    sweep_temp_dirs = 0
 
     # os.mkfifo is apparently not supported under Windows.
     support_fifo = 0
     prefer_fifo_data = 0
+    fifo_workers = 4
+    default_transport = None
+    gnuplot_version = None
+    calibration_file = None
+    auto_calibrate = 0
+    batch_flush_bytes = 4096
 
     # The default choice for the 'set term' command (to display on
     # screen):
@@ -110,6 +133,14 @@ class GnuplotProcess:
     def __del__(self):
         self.close()
 
+    def write_bytes(self, b):
+        """Pass raw bytes (e.g., data) to the gnuplot program."""
+
+        # Flush the text layer first so that the bytes stay in order
+        # with any commands written before them:
+        self.gnuplot.flush()
+        self.gnuplot.buffer.write(b)
+
     def __call__(self, s):
         """Send a command string to gnuplot, followed by newline."""
 
@@ -13,10 +13,12 @@ behavior.
 
 """
 
-import os, tempfile
-from io import StringIO
+import os, sys, mmap, weakref, itertools, threading
 import numpy
-from . import gp, utils, errors
+import numpy.lib.format
+import numpy.lib.recfunctions
+from . import gp, utils, errors, datacache, fifopool, tempdirs
+from . import transports
 
 
 class _unset:
@@ -25,6 +27,176 @@ class _unset:
     pass
 
 
+# numpy types that gnuplot can read as general binary data.  The
+# gnuplot names of the types are the same as the numpy names:
+_binary_types = [
+    'int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+    'int64', 'uint64', 'float32', 'float64',
+    ]
+
+
+def _binary_format(dtype, columns):
+    """Return the gnuplot binary 'format' for records of 'columns' numbers."""
+
+    name = numpy.dtype(dtype).name
+    if name not in _binary_types:
+        raise errors.DataError(
+            'data of type %s cannot be sent to gnuplot in binary' % (name,))
+    return ('%%%s' % (name,)) * columns
+
+
+def _binary_file_option(dtype, shape, skip=0):
+    """Return the 'binary' option describing an array stored in a file.
+
+    The array, of type 'dtype' and shape 'shape', is assumed to be
+    stored in C order starting 'skip' bytes into the file.  The last
+    index selects the values within a data point, unless 'dtype' is a
+    structured type, in which case each element is a data point.
+
+    """
+
+    dtype = numpy.dtype(dtype)
+    if dtype.names is None:
+        if len(shape) == 1:
+            (points, columns) = (shape[0], 1)
+        else:
+            points = int(numpy.prod(shape[:-1]))
+            columns = shape[-1]
+        fmt = _binary_format(dtype, columns)
+        byteorder = dtype.byteorder
+    else:
+        # Each field of the record becomes one or more columns:
+        points = int(numpy.prod(shape))
+        fmt = []
+        byteorder = '|'
+        size = 0
+        for name in dtype.names:
+            (field, offset) = dtype.fields[name][:2]
+            if offset != size:
+                raise errors.DataError(
+                    'padded record types cannot be read by gnuplot')
+            (base, subshape) = (field.base, field.shape)
+            fmt.append(_binary_format(base, int(numpy.prod(subshape))))
+            if base.byteorder != '|':
+                byteorder = base.byteorder
+            size += field.itemsize
+        if size != dtype.itemsize:
+            raise errors.DataError(
+                'padded record types cannot be read by gnuplot')
+        fmt = ''.join(fmt)
+
+    option = ['record=%d' % (points,), 'format="%s"' % (fmt,)]
+    if skip:
+        option.insert(0, 'skip=%d' % (skip,))
+    if byteorder == '<' or (byteorder == '=' and sys.byteorder == 'little'):
+        option.append('endian=little')
+    elif byteorder == '>' or (byteorder == '=' and sys.byteorder == 'big'):
+        option.append('endian=big')
+    return ' '.join(option)
+
+
+def _memmap_location(data):
+    """Return (filename, offset) of the file holding the memmap 'data'.
+
+    Return None if 'data' is not a memmap whose contents can be read
+    by gnuplot directly from its file, in C order.
+
+    """
+
+    mm = getattr(data, '_mmap', None)
+    filename = getattr(data, 'filename', None)
+    if mm is None or filename is None or getattr(data, 'mode', 'c') == 'c':
+        # (Copy-on-write memmaps might differ from their file.)
+        return None
+    if not data.flags.c_contiguous or mm.closed:
+        return None
+
+    # The mmap starts at the last allocation boundary before the
+    # memmap's offset; find where 'data' lies within it:
+    start = data.offset - data.offset % mmap.ALLOCATIONGRANULARITY
+    base = numpy.frombuffer(mm, numpy.uint8).__array_interface__['data'][0]
+    pos = data.__array_interface__['data'][0] - base
+    if pos < 0 or pos + data.nbytes > len(mm):
+        return None
+    if data.mode != 'r':
+        # Make sure that gnuplot sees the current contents:
+        data.flush()
+    return (filename, start + pos)
+
+
+class _StreamedContent:
+    """The content of a data file, generated chunk by chunk on demand.
+
+    Iterating over a '_StreamedContent' calls 'func(*args)', which
+    should return an iterable over chunks of bytes (for example
+    'utils.array_chunks(data)').  Only the arguments are stored, so
+    the full text (or binary) form of the data never has to be held in
+    memory.  It can be iterated over more than once, for example to
+    resend inline data for each plot.
+
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __iter__(self):
+        return iter(self.func(*self.args))
+
+
+class _LazyContent:
+    """The content of a data file, generated when it is first needed.
+
+    The first iteration generates the content from the
+    '_StreamedContent' 'content'.  If it comes to no more than 'keep'
+    bytes (None means no limit), the generated bytes are kept for
+    later iterations and 'content' (with its reference to the data
+    array) is dropped; otherwise the content is generated again each
+    time.
+
+    """
+
+    def __init__(self, content, keep=None):
+        self.content = content
+        self.keep = keep
+        self.data = None
+
+    def __iter__(self):
+        if self.data is not None:
+            return iter([self.data])
+        return self._generate()
+
+    def _generate(self):
+        chunks = []
+        size = 0
+        for chunk in self.content:
+            if chunks is not None:
+                size += len(chunk)
+                if self.keep is not None and size > self.keep:
+                    chunks = None
+                else:
+                    chunks.append(bytes(chunk))
+            yield chunk
+        if chunks is not None:
+            self.data = b''.join(chunks)
+            self.content = None
+
+
+def _write_content(write, content):
+    """Write 'content' using the function 'write'.
+
+    'content' can be a string, a bytes object, or an iterable over
+    chunks of bytes such as a '_StreamedContent'.
+
+    """
+
+    if isinstance(content, (str, bytes)):
+        write(content)
+    else:
+        for chunk in content:
+            write(chunk)
+
+
 class PlotItem:
     """Plotitem represents an item that can be plotted by gnuplot.
 
@@ -70,8 +242,20 @@ class PlotItem:
               {'title' : ('Data', 'title "Data"'),
                'with' : ('linespoints', 'with linespoints')}
 
+      '_command' -- the plot command built by 'command()', kept so that
+          it does not have to be rebuilt for every plot, or None if it
+          has to be built (again).  'set_option()' and 'clear_option()'
+          reset it; derived classes that change the command in any
+          other way must reset it too.
+
+    PlotItems define '__slots__' to keep them small; derived classes
+    should list any new members in their own '__slots__' (or leave it
+    out, in which case their instances get a '__dict__').
+
     """
 
+    __slots__ = ('_options', '_command', '__weakref__')
+
     # For _option_list explanation, see docstring for PlotItem.
     _option_list = {
         'axes': lambda self, axes: self.set_string_option(
@@ -110,6 +294,7 @@ class PlotItem:
         """
 
         self._options = {}
+        self._command = None
         self.set_option(**keyw)
 
     def get_option(self, name):
@@ -142,6 +327,7 @@ class PlotItem:
                     'Cannot modify %s option after construction!', option)
             else:
                 setter(self, value)
+        self._command = None
 
     def set_string_option(self, option, value, default, fmt):
         """Set an option that takes a string value."""
@@ -160,6 +346,7 @@ class PlotItem:
             del self._options[name]
         except KeyError:
             pass
+        self._command = None
 
     def get_base_command_string(self):
         raise NotImplementedError()
@@ -176,15 +363,28 @@ class PlotItem:
         """Build the plot command to be sent to gnuplot.
 
         Build and return the plot command, with options, necessary to
-        display this item.  If anything else needs to be done once per
-        plot, it can be done here too.
+        display this item.  Anything else that needs to be done once
+        per plot belongs in 'prepare()' or 'pipein()'.
 
         """
 
-        return ' '.join([
-            self.get_base_command_string(),
-            self.get_command_option_string(),
-            ])
+        if self._command is None:
+            self._command = ' '.join([
+                self.get_base_command_string(),
+                self.get_command_option_string(),
+                ])
+        return self._command
+
+    def prepare(self, g):
+        """Prepare the item for being plotted by the Gnuplot object 'g'.
+
+        This is called for each item before the plot command is built,
+        and can send gnuplot any commands or data that the item needs
+        beforehand.  Can be overridden in derived classes.
+
+        """
+
+        pass
 
     def pipein(self, f):
         """Pipe necessary inline data to gnuplot.
@@ -218,6 +418,8 @@ class Func(PlotItem):
 
     """
 
+    __slots__ = ('function',)
+
     def __init__(self, function, **keyw):
         PlotItem.__init__(self, **keyw)
         self.function = function
@@ -232,8 +434,22 @@ class _FileItem(PlotItem):
     This class is not meant for users but rather as a base class for
     other types of FileItem.
 
+    Members:
+
+        'filename' -- the name of the file, as passed to gnuplot.
+
+        'decimated' -- the number of data points that were left out
+            by decimation (see the 'decimate' option of 'Data').
+
+        'transport' -- the 'transports.Decision' by which the
+            transport of the data was chosen, or None if it was not
+            chosen automatically (see the 'transport' option of
+            'Data').
+
     """
 
+    __slots__ = ('filename', 'decimated', 'transport')
+
     _option_list = PlotItem._option_list.copy()
     _option_list.update({
         'binary': lambda self, binary: self.set_option_binary(binary),
@@ -273,8 +489,13 @@ class _FileItem(PlotItem):
             'index=<value>' -- plot 'index <value>'.  <value> is
                 formatted as for 'using' option.
 
-            'binary=<boolean>' -- data in the file is in binary format
-                (this option is only allowed for grid data for splot).
+            'binary=<boolean>' -- data in the file is in gnuplot's
+                binary matrix format (grid data for splot).
+
+            'binary=<string>' -- data in the file is general binary
+                data described by <string>, which is passed to gnuplot
+                as 'binary <string>' (e.g., 'record=100
+                format="%float64%float64"').
 
             'smooth=<string>' -- smooth the data.  Option should be
                 'unique', 'csplines', 'acsplines', 'bezier', or
@@ -293,6 +514,8 @@ class _FileItem(PlotItem):
         """
 
         self.filename = filename
+        self.decimated = 0
+        self.transport = None
 
         PlotItem.__init__(self, **keyw)
 
@@ -319,7 +542,12 @@ class _FileItem(PlotItem):
             raise errors.OptionError('%s=%s' % (name, value,))
 
     def set_option_binary(self, binary):
-        if binary:
+        if isinstance(binary, str):
+            if not gp.GnuplotOpts.recognizes_binary_data:
+                raise errors.OptionError(
+                    'Gnuplot.py is currently configured to reject binary data')
+            self._options['binary'] = (binary, 'binary %s' % (binary,))
+        elif binary:
             if not gp.GnuplotOpts.recognizes_binary_splot:
                 raise errors.OptionError(
                     'Gnuplot.py is currently configured to reject binary data')
@@ -329,33 +557,45 @@ class _FileItem(PlotItem):
 
 
 class _NewFileItem(_FileItem):
-    def __init__(self, content, filename=None, **keyw):
+    __slots__ = ('temp', 'content', 'mode')
+
+    def __init__(self, content, filename=None, lazy=0, memory=0, **keyw):
 
         binary = keyw.get('binary', 0)
-        if binary:
-            mode = 'wb'
+        if binary or not isinstance(content, str):
+            self.mode = 'wb'
         else:
-            mode = 'w'
+            self.mode = 'w'
 
         if filename:
             # This is a permanent file
             self.temp = False
-            f = open(filename, mode)
+            f = open(filename, self.mode)
+        elif memory and not lazy:
+            # Write to a file in memory (or on disk if over budget):
+            self.temp = True
+            if isinstance(content, str):
+                content = content.encode('ascii')
+            filename = tempdirs.default().write(
+                lambda f: _write_content(f.write, content), memory=1)
+            f = None
         else:
             self.temp = True
-            if hasattr(tempfile, 'mkstemp'):
-                # Use the new secure method of creating temporary files:
-                (fd, filename,) = tempfile.mkstemp(
-                    suffix='.gnuplot', text=(not binary)
-                    )
-                f = os.fdopen(fd, mode)
-            else:
-                # for backwards compatibility to pre-2.3:
-                filename = tempfile.mktemp()
-                f = open(filename, mode)
+            (fd, filename,) = tempdirs.default().mkstemp(
+                suffix='.gnuplot', text=(not binary)
+                )
+            f = os.fdopen(fd, self.mode)
 
-        f.write(content)
-        f.close()
+        if f is None:
+            self.content = None
+        elif lazy and self.temp:
+            # Write the file when the item is first plotted:
+            f.close()
+            self.content = content
+        else:
+            _write_content(f.write, content)
+            f.close()
+            self.content = None
 
         # If the user hasn't specified a title, set it to None so
         # that the name of the temporary file is not used:
@@ -364,9 +604,54 @@ class _NewFileItem(_FileItem):
 
         _FileItem.__init__(self, filename, **keyw)
 
-    def __del__(self):
+    def prepare(self, g):
         if self.temp:
-            os.unlink(self.filename)
+            # Let the session account for and clean up the file:
+            g.tempdir().adopt(self)
+
+    def command(self):
+        if self.content is not None:
+            with open(self.filename, self.mode) as f:
+                _write_content(f.write, self.content)
+            self.content = None
+        return _FileItem.command(self)
+
+    def __del__(self):
+        # (__init__ may have failed before setting these:)
+        if getattr(self, 'temp', False) and getattr(self, 'filename', None):
+            tempdirs.remove(self.filename)
+
+
+class _CachedFileItem(_FileItem):
+    """A _FileItem whose data are in a temporary file of the data cache.
+
+    The file is shared with other items that plot the same data with
+    the same options, and is only written if the cache does not hold
+    such a file already (see 'datacache.DataCache').  'key' is the
+    cache key of the data; 'content' is written to the file if
+    necessary.
+
+    """
+
+    __slots__ = ('cache', 'key')
+
+    def __init__(self, key, content, **keyw):
+        # If the user hasn't specified a title, set it to None so
+        # that the name of the temporary file is not used:
+        if 'title' not in keyw:
+            keyw['title'] = None
+
+        self.cache = datacache.cache
+        self.key = None
+        filename = self.cache.acquire(
+            key, lambda f: _write_content(f.write, content))
+        self.key = key
+
+        _FileItem.__init__(self, filename, **keyw)
+
+    def __del__(self):
+        if self.key is not None:
+            self.cache.release(self.key)
 
 
 class _InlineFileItem(_FileItem):
@@ -374,84 +659,218 @@ class _InlineFileItem(_FileItem):
 
     """
 
+    __slots__ = ('content',)
+
     def __init__(self, content, **keyw):
         # If the user hasn't specified a title, set it to None so that
         # '-' is not used:
         if 'title' not in keyw:
             keyw['title'] = None
 
-        if keyw.get('binary', 0):
-            raise errors.OptionError('binary inline data is not supported')
-
+        _check_inline_binary(keyw)
         _FileItem.__init__(self, '-', **keyw)
 
-        if content[-1] == '\n':
+        binary = keyw.get('binary', 0)
+        if isinstance(content, str):
+            content = content.encode('ascii')
+        if binary or not isinstance(content, bytes):
+            # Streamed text content always ends with a newline.
+            self.content = content
+        elif content[-1:] == b'\n':
             self.content = content
         else:
-            self.content = content + '\n'
+            self.content = content + b'\n'
 
     def pipein(self, f):
-        f.write(self.content + 'e\n')
+        _write_content(f.write_bytes, self.content)
+        (binary, strg) = self._options.get('binary', (0, None))
+        if not binary:
+            # Binary data has a known length so it needs no terminator:
+            f.write_bytes(b'e\n')
 
 
-if gp.GnuplotOpts.support_fifo:
-    import threading
+def _pipe_file(f, filename, binary):
+    """Send the contents of the file 'filename' to gnuplot as inline data.
 
-    class _FIFOWriter(threading.Thread):
-        """Create a FIFO (named pipe), write to it, then delete it.
+    'f' is the GnuplotProcess (or the command file).  If it has a
+    'write_file()' method, as the Unix GnuplotProcess does, the data
+    are sent by it without being copied through Python; otherwise they
+    are read and sent a chunk at a time.  Text data are followed by
+    the 'e' that ends them (and by a newline first if the file does
+    not end with one).
 
-        The writing takes place in a separate thread so that the main
-        thread is not blocked.  The idea is that once the writing is
-        finished we know that gnuplot is done with the data that were in
-        the file so we can delete the file.  This technique removes the
-        ambiguity about when the temporary files should be deleted.
+    """
 
-        Since the tempfile module does not provide an easy, secure way
-        to create a FIFO without race conditions, we instead create a
-        temporary directory using mkdtemp() then create the FIFO
-        within that directory.  When the writer thread has written the
-        full information to the FIFO, it deletes both the FIFO and the
-        temporary directory that contained it.
+    if hasattr(f, 'write_file'):
+        f.write_file(filename)
+    else:
+        with open(filename, 'rb') as source:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                f.write_bytes(chunk)
+    if not binary:
+        with open(filename, 'rb') as source:
+            if source.seek(0, os.SEEK_END):
+                source.seek(-1, os.SEEK_END)
+                if source.read(1) != b'\n':
+                    f.write_bytes(b'\n')
+        f.write_bytes(b'e\n')
+
+
+def _check_inline_binary(keyw):
+    binary = keyw.get('binary', 0)
+    if binary and not isinstance(binary, str):
+        raise errors.OptionError(
+            'binary inline data must be in general binary format')
 
-        """
 
-        def __init__(self, content, mode='w'):
-            self.content = content
-            self.mode = mode
-            if hasattr(tempfile, 'mkdtemp'):
-                # Make the file within a temporary directory that is
-                # created securely:
-                self.dirname = tempfile.mkdtemp(suffix='.gnuplot')
-                self.filename = os.path.join(self.dirname, 'fifo')
-            else:
-                # For backwards compatibility pre-2.3, just use
-                # mktemp() to create filename:
-                self.dirname = None
-                self.filename = tempfile.mktemp()
-            threading.Thread.__init__(
-                self,
-                name=('FIFO Writer for %s' % (self.filename,)),
-                )
-            os.mkfifo(self.filename)
-            self.start()
+class _InlineFromFileItem(_FileItem):
+    """A _FileItem that sends the contents of a file as inline data.
 
-        def run(self):
-            f = open(self.filename, self.mode)
-            f.write(self.content)
-            f.close()
-            os.unlink(self.filename)
-            if self.dirname is not None:
-                os.rmdir(self.dirname)
+    The file 'source' is read anew for each plot (see '_pipe_file()').
+
+    """
+
+    __slots__ = ('source',)
+
+    def __init__(self, source, **keyw):
+        # Keep the title that gnuplot would give the file:
+        if 'title' not in keyw:
+            keyw['title'] = source
 
+        _check_inline_binary(keyw)
+        _FileItem.__init__(self, '-', **keyw)
+        self.source = source
+
+    def pipein(self, f):
+        (binary, strg) = self._options.get('binary', (0, None))
+        _pipe_file(f, self.source, binary)
+
+
+class _CachedInlineItem(_CachedFileItem):
+    """A _CachedFileItem whose file is sent to gnuplot as inline data.
+
+    The data are formatted only once, into the file of the data cache,
+    and the file is sent for each plot (see '_pipe_file()').
+
+    """
+
+    __slots__ = ()
+
+    def __init__(self, key, content, **keyw):
+        _check_inline_binary(keyw)
+        _CachedFileItem.__init__(self, key, content, **keyw)
+
+    def get_base_command_string(self):
+        return gp.double_quote_string('-')
+
+    def pipein(self, f):
+        (binary, strg) = self._options.get('binary', (0, None))
+        _pipe_file(f, self.filename, binary)
+
+
+def _undefine_datablock(sessions, name, later=0):
+    """Delete the datablock 'name' in the Gnuplot objects 'sessions'.
+
+    If 'later' is set, it is deleted before the next command sent to
+    each of them (see 'Gnuplot._undefine_later()').
+
+    """
+
+    for g in list(sessions):
+        if g.gnuplot is None:
+            pass
+        elif later:
+            g._undefine_later(name)
+        else:
+            g('undefine %s' % (name,))
+    sessions.clear()
+
+
+class _DatablockItem(_FileItem):
+    """A _FileItem whose data are stored in a gnuplot named datablock.
+
+    The data are sent to each Gnuplot object that plots the item only
+    once, the first time it is plotted, as a datablock ('$name << EOD'
+    ... 'EOD'); the plot command then refers to the datablock by name.
+    Replots and hardcopies therefore do not send the data again.  The
+    datablock is deleted (with 'undefine') when 'release()' is called,
+    or before the next command once the item has been deleted.
+    Datablocks require gnuplot 5.0 or later and can only hold text
+    data.
+
+    """
 
+    __slots__ = ('content', 'sessions', '_finalizer')
+
+    _names = itertools.count()
+
+    def __init__(self, content, **keyw):
+        # If the user hasn't specified a title, set it to None so that
+        # the name of the datablock is not used:
+        if 'title' not in keyw:
+            keyw['title'] = None
+
+        if keyw.get('binary', 0):
+            raise errors.OptionError('datablocks cannot hold binary data')
+
+        _FileItem.__init__(self, '$gp_data_%d' % (next(self._names),), **keyw)
+
+        if isinstance(content, str):
+            content = content.encode('ascii')
+        if isinstance(content, bytes) and content[-1:] != b'\n':
+            content = content + b'\n'
+        self.content = content
+
+        # The Gnuplot objects that hold the datablock:
+        self.sessions = weakref.WeakSet()
+        # (The item may be collected while data are being sent, so the
+        # datablock is only deleted with the next command:)
+        self._finalizer = weakref.finalize(
+            self, _undefine_datablock, self.sessions, self.filename, 1)
+
+    def get_base_command_string(self):
+        return self.filename
+
+    def prepare(self, g):
+        if g not in self.sessions:
+            g('%s << EOD' % (self.filename,))
+            _write_content(g.gnuplot.write_bytes, self.content)
+            g.gnuplot.write_bytes(b'EOD\n')
+            self.sessions.add(g)
+
+    def release(self):
+        """Delete the datablock from gnuplot.
+
+        If the item is plotted again, the data are sent again.
+
+        """
+
+        _undefine_datablock(self.sessions, self.filename)
+
+
+if gp.GnuplotOpts.support_fifo:
     class _FIFOFileItem(_FileItem):
         """A _FileItem based on a FIFO (named pipe).
 
+        The FIFO and the thread that writes to it are provided by the
+        'FIFOManager' of the Gnuplot session the item is plotted in (see
+        'fifopool').  The same FIFO is used each time the item is
+        plotted in that session, and 'prepare()' queues the content to
+        be written to it again for each plot.  If the command of the
+        item is built outside a session, its FIFO is taken from the
+        default FIFOManager, and the content has to be queued there
+        with 'send()'.
+
         This class depends on the availablity of os.mkfifo(), which only
         exists under Unix.
 
         """
 
+        __slots__ = ('content',)
+
         def __init__(self, content, **keyw):
             # If the user hasn't specified a title, set it to None so that
             # the name of the temporary FIFO is not used:
@@ -459,24 +878,108 @@ if gp.GnuplotOpts.support_fifo:
                 keyw['title'] = None
 
             _FileItem.__init__(self, '', **keyw)
+            if isinstance(content, str):
+                content = content.encode('ascii')
             self.content = content
-            if keyw.get('binary', 0):
-                self.mode = 'wb'
-            else:
-                self.mode = 'w'
 
         def get_base_command_string(self):
-            """Create the gnuplot command for plotting this item.
+            return gp.double_quote_string(self.filename)
+
+        def use(self, fifos):
+            """Use the FIFO of this item in 'fifos' in the command."""
+
+            filename = fifos.fifo(self)
+            if filename != self.filename:
+                self.filename = filename
+                self._command = None
 
-            The basecommand is different each time because each FIFOWriter
-            creates a new FIFO.
+        def send(self, fifos):
+            """Queue the content for the FIFO of this item in 'fifos'."""
 
-            """
+            self.use(fifos)
+            fifos.send(self.filename, self.write)
 
-            # Create a new FIFO and a thread to write to it.  Retrieve the
-            # filename of the FIFO to be used in the basecommand.
-            fifo = _FIFOWriter(self.content, self.mode)
-            return gp.double_quote_string(fifo.filename)
+        def write(self, f):
+            _write_content(f.write, self.content)
+
+        def prepare(self, g):
+            # Each plot reads the FIFO once, so the content has to be
+            # queued again for each plot:
+            self.send(g.fifos())
+
+        def command(self):
+            if not self.filename:
+                self.use(fifopool.default_manager())
+            return PlotItem.command(self)
+
+
+def _data_item(content, inline, filename, stream, key=None, lazy=0,
+               datablock=0, memory=0, fifo=None, **keyw):
+    """Return a _FileItem that passes 'content' to gnuplot.
+
+    'content' is a '_StreamedContent'.  Files are written from it
+    chunk by chunk straight away.  Inline and FIFO items have to keep
+    their content until they are plotted; if 'stream' is set they
+    keep the '_StreamedContent' itself, otherwise the content is
+    collected into a bytes object.
+
+    If 'key' is not None, temporary files are taken from the data
+    cache.  Inline data are then formatted into a file of the cache
+    too, which is sent to gnuplot for each plot.  'key' is a tuple
+    '(arrays, options)' of the arrays from which the content is
+    generated and of the options that affect it; it is only hashed if
+    a temporary file is actually needed.
+
+    If 'lazy' is set, nothing is written until the item is first
+    plotted.  Inline and FIFO items then keep the generated content
+    for later plots if it is no bigger than
+    gp.GnuplotOpts.lazy_data_keep_bytes, and otherwise generate it
+    again each time (see '_LazyContent').
+
+    If 'datablock' is set, the content is sent to gnuplot as a named
+    datablock (see '_DatablockItem').
+
+    If 'memory' is set, temporary files that are not cached are kept
+    in memory if possible (see 'tempdirs').
+
+    If 'fifo' is set, the content is sent through a FIFO (see
+    '_FIFOFileItem'); if it is None, FIFOs are used if
+    gp.GnuplotOpts.prefer_fifo_data is set, 'key' is None and
+    'memory' is not set.
+
+    """
+
+    if filename:
+        return _NewFileItem(content, filename=filename, **keyw)
+    elif datablock:
+        cls = _DatablockItem
+    elif inline:
+        if key is not None:
+            # Format the data once, into the cache, then send the file:
+            (arrays, options) = key
+            return _CachedInlineItem(
+                datacache.data_key(arrays, *options), content, **keyw)
+        cls = _InlineFileItem
+    elif fifo or (fifo is None and key is None and not memory
+                  and gp.GnuplotOpts.prefer_fifo_data):
+        # (Cached data and memory files need a temporary file, so they
+        # are not sent through a FIFO unless that is asked for
+        # explicitly.)
+        cls = _FIFOFileItem
+    elif key is not None:
+        (arrays, options) = key
+        return _CachedFileItem(
+            datacache.data_key(arrays, *options), content, **keyw)
+    else:
+        return _NewFileItem(content, lazy=lazy, memory=memory, **keyw)
+
+    if stream:
+        pass
+    elif lazy:
+        content = _LazyContent(content, gp.GnuplotOpts.lazy_data_keep_bytes)
+    else:
+        content = b''.join(content)
+    return cls(content, **keyw)
 
 
 def File(filename, **keyw):
@@ -487,7 +990,82 @@ def File(filename, **keyw):
 
     <filename> is a string holding the filename of an existing file.
     The keyword arguments are the same as those of the _FileItem
-    constructor.
+    constructor, plus:
+
+        'inline=<bool>' -- send the contents of the file to gnuplot
+            as inline data for each plot, rather than letting gnuplot
+            read the file (e.g., if gnuplot runs where the file cannot
+            be seen).  Under Unix, the contents are moved from the file
+            to the pipe without being copied through Python.  Binary
+            files need a general binary format, e.g.
+            'binary=\'record=100 format="%float64"\''.
+
+    """
+
+    if not isinstance(filename, str):
+        raise errors.OptionError(
+            'Argument (%s) must be a filename' % (filename,)
+            )
+    if 'inline' in keyw:
+        inline = keyw['inline']
+        del keyw['inline']
+    else:
+        inline = 0
+    if inline:
+        return _InlineFromFileItem(filename, **keyw)
+    return _FileItem(filename, **keyw)
+
+
+def _memmap_item(data, keyw):
+    """Return a _FileItem that plots the memmap 'data' from its file.
+
+    Return None if that is not possible or not wanted (text data).
+    'keyw' are the keyword arguments passed to 'Data'.
+
+    """
+
+    if not keyw.get('binary', 1) or not gp.GnuplotOpts.recognizes_binary_data:
+        return None
+    if not 1 <= len(data.shape) <= 2 or data.size == 0:
+        return None
+    location = _memmap_location(data)
+    if location is None:
+        return None
+    (filename, skip) = location
+    try:
+        binary = _binary_file_option(data.dtype, data.shape, skip)
+    except errors.DataError:
+        return None
+
+    keyw = keyw.copy()
+    for option in ['inline', 'filename', 'stream', 'precision', 'gaps',
+                   'cache', 'lazy', 'datablock', 'memory', 'fifo',
+                   'transport', 'replots']:
+        keyw.pop(option, None)
+    keyw['binary'] = binary
+    if 'title' not in keyw:
+        keyw['title'] = None
+    return _FileItem(filename, **keyw)
+
+
+def NpyFile(filename, **keyw):
+    """Construct a _FileItem referring to an existing '.npy' file.
+
+    The array in the file is plotted in place: gnuplot is told to
+    read it as binary data starting after the '.npy' header, so it
+    does not have to be loaded or converted by Python at all.  As for
+    'Data', the last index of the array selects the values within a
+    data point (so an array of shape (n, 2) is plotted as n (x, y)
+    points).  Arrays with a structured dtype are plotted with one
+    data point per element and one column per field.  Fortran-ordered
+    arrays with more than one dimension cannot be plotted this way.
+
+    The keyword arguments are the same as those of the _FileItem
+    constructor, except that 'binary' is set automatically.  With
+    'binary=0', or if gnuplot cannot read binary data (see
+    gp.GnuplotOpts.recognizes_binary_data), the array is loaded
+    instead and sent as text data, as by 'Data' (which then also
+    accepts its options).
 
     """
 
@@ -495,9 +1073,146 @@ def File(filename, **keyw):
         raise errors.OptionError(
             'Argument (%s) must be a filename' % (filename,)
             )
+    if not keyw.get('binary', 1) or not gp.GnuplotOpts.recognizes_binary_data:
+        data = numpy.load(filename, mmap_mode='r')
+        if data.dtype.names is not None:
+            # One column per field, as in binary mode:
+            data = numpy.lib.recfunctions.structured_to_unstructured(data)
+        if 'title' not in keyw:
+            keyw['title'] = filename
+        keyw['binary'] = 0
+        return Data(data, **keyw)
+    with open(filename, 'rb') as f:
+        version = numpy.lib.format.read_magic(f)
+        if version == (1, 0):
+            header = numpy.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            header = numpy.lib.format.read_array_header_2_0(f)
+        else:
+            raise errors.DataError(
+                'unsupported .npy format version %d.%d' % version)
+        skip = f.tell()
+    (shape, fortran_order, dtype) = header
+    if fortran_order and len(shape) > 1:
+        raise errors.DataError(
+            'Fortran-ordered arrays cannot be plotted in place')
+    if 0 in shape:
+        raise errors.DataError('cannot plot an empty array')
+
+    keyw['binary'] = _binary_file_option(dtype, shape, skip)
     return _FileItem(filename, **keyw)
 
 
+def _datablock_option(keyw, filename):
+    """Process the 'datablock' keyword argument of Data and GridData.
+
+    Remove it from 'keyw' and return whether the data should be sent
+    as a datablock (which takes precedence over 'inline').  By
+    default, text data that are not written to a permanent file are
+    sent as a datablock if gp.GnuplotOpts.prefer_datablock_data is
+    set.
+
+    """
+
+    if 'datablock' in keyw:
+        datablock = keyw['datablock']
+        del keyw['datablock']
+        if datablock and (filename or keyw.get('binary', 0)):
+            raise errors.OptionError(
+                'datablock data cannot be binary or saved to a file')
+        if datablock and not gp.GnuplotOpts.recognizes_datablocks:
+            raise errors.OptionError(
+                'Gnuplot.py is currently configured to reject datablocks')
+        return datablock
+    else:
+        return (
+            gp.GnuplotOpts.prefer_datablock_data
+            and gp.GnuplotOpts.recognizes_datablocks
+            and not (filename or keyw.get('binary', 0))
+            )
+
+
+def _fifo_option(keyw):
+    """Process the 'fifo' keyword argument of Data and GridData.
+
+    Remove it from 'keyw' and return its value, or None if it was not
+    given (then gp.GnuplotOpts.prefer_fifo_data decides).
+
+    """
+
+    if 'fifo' in keyw:
+        fifo = keyw['fifo']
+        del keyw['fifo']
+        if fifo and not gp.GnuplotOpts.support_fifo:
+            raise errors.OptionError(
+                'FIFOs are not supported on this platform')
+        return fifo
+    else:
+        return None
+
+
+def _transport_option(kind, data, keyw):
+    """Process the 'transport' and 'replots' keyword arguments.
+
+    Remove them from 'keyw'.  If the transport is 'auto' (by default,
+    if gp.GnuplotOpts.default_transport is), let the policy in
+    'transports' choose how the data are sent, add the options it
+    chooses to 'keyw' (unless they were given explicitly) and return
+    its 'Decision'; otherwise return None.
+
+    """
+
+    if 'transport' in keyw:
+        transport = keyw['transport']
+        del keyw['transport']
+    else:
+        transport = gp.GnuplotOpts.default_transport
+
+    if 'replots' in keyw:
+        replots = keyw['replots']
+        del keyw['replots']
+    else:
+        replots = 1
+
+    if transport is None:
+        return None
+    elif transport != 'auto':
+        raise errors.OptionError('transport=%r' % (transport,))
+    decision = transports.policy.choose(kind, data, keyw, replots)
+    for (name, value) in decision.options.items():
+        keyw.setdefault(name, value)
+    return decision
+
+
+def _decimate(data, method, width):
+    """Reduce 2-d array 'data' to the points needed at 'width' pixels.
+
+    'method' is 'minmax' or 'lttb' (see 'utils.decimate_minmax()' and
+    'utils.decimate_lttb()').  Return the reduced array and the number
+    of points that were left out.  Single-column data are plotted
+    against their index, so the original indices are added as an x
+    column.
+
+    """
+
+    if len(data.shape) != 2:
+        raise errors.DataError(
+            'only one- and two-dimensional data can be decimated')
+    n = data.shape[0]
+    if method == 'minmax':
+        keep = utils.decimate_minmax(data, width)
+    elif method == 'lttb':
+        keep = utils.decimate_lttb(data, 2 * width)
+    else:
+        raise errors.OptionError('decimate=%s' % (method,))
+    if len(keep) == n:
+        return (data, 0)
+    elif data.shape[1] == 1:
+        return (numpy.column_stack((keep, data[keep, 0])), n - len(keep))
+    else:
+        return (data[keep], n - len(keep))
+
+
 def Data(*data, **keyw):
     """Create and return a _FileItem representing the data from *data.
 
@@ -514,7 +1229,19 @@ def Data(*data, **keyw):
     each data point is composed of one point from each array.  E.g.,
     'Data(x,x**2)' is a 'PlotItem' that represents x squared as a
     function of x.  For the output format, see the comments for
-    'write_array()'.
+    'write_array()'.  A single float32 or float64 array is used
+    without being copied, and integer arrays are written as integers
+    (see 'utils.float_array()').  A 'numpy.memmap' that is backed by
+    a file is not copied at all: unless 'inline', 'filename' or 'cols'
+    is specified (or 'binary=0', or gnuplot cannot read binary data),
+    gnuplot is told to read the data as binary directly from the
+    memmap's file (see also 'NpyFile').
+
+    Missing data can be given as NaN values or as masked values of a
+    'numpy.ma' masked array.  In text data they are written as the
+    string gp.GnuplotOpts.missing_data, which 'Gnuplot' objects
+    declare to gnuplot with 'set datafile missing'; in binary data
+    they are sent as NaN.
 
     How the data are written to gnuplot depends on the 'inline'
     argument and preference settings for the platform in use.
@@ -532,11 +1259,165 @@ def Data(*data, **keyw):
 
         'filename=<string>' -- save data to a permanent file.
 
+        'binary=<bool>' -- send the data to gnuplot as raw binary
+            records rather than as text (inline or via a file).  The
+            numbers are sent with the type of the data array (float32,
+            float64, or one of the integer types) if gnuplot can read
+            it, and as float32 otherwise.  Only one- and
+            two-dimensional data can be sent in binary form.  This
+            saves the time needed to format and parse the numbers and
+            usually reduces the amount of data that has to be
+            transferred.  Requires
+            gp.GnuplotOpts.recognizes_binary_data.
+
+        'precision=<int>' -- write floating-point numbers in text
+            data with only this many significant digits, in the
+            compact '%g' format.  This reduces the amount of text that
+            has to be formatted, transferred and parsed; six digits
+            are more than enough for most plots.  The default is the
+            value of gp.GnuplotOpts.default_precision.  If it is None,
+            numbers are written with full precision.  (Integers are
+            always written without a decimal part, and binary data
+            always have full precision.)
+
+        'gaps=<bool>' -- leave out data points that contain missing
+            values and write a blank line in place of each run of
+            them, so that gnuplot breaks lines drawn through the data
+            at the gaps (text data only).
+
+        'stream=<bool>' -- keep a reference to the data array instead
+            of a formatted copy of the data, and format the data chunk
+            by chunk straight into the gnuplot pipe or FIFO each time
+            the item is plotted.  This bounds the memory used by
+            inline and FIFO items at the cost of formatting the data
+            for every plot; the array should not be modified while the
+            item is in use.  (Data written to files are always
+            formatted chunk by chunk.)  The default is the value of
+            gp.GnuplotOpts.prefer_streaming_data.
+
+        'cache=<bool>' -- take the temporary file from the data cache,
+            so that plotting the same data again with the same options
+            reuses the file written the first time instead of
+            formatting and writing the data again (see 'datacache').
+            Cached data are not sent through a FIFO unless 'fifo=1'
+            is given.  With 'inline', the data are formatted once into
+            a file of the cache, which is sent for each plot (under
+            Unix without being copied through Python).
+            The array should not be modified while the item is in
+            use.  The default is the value of
+            gp.GnuplotOpts.prefer_cached_data.
+
+        'lazy=<bool>' -- keep only a reference to the data array and
+            format the data when the item is first plotted, so that
+            items that are never plotted cost nothing.  Inline and
+            FIFO items then keep the formatted data for later plots,
+            unless it is bigger than gp.GnuplotOpts.lazy_data_keep_bytes
+            in which case it is formatted again for every plot (as with
+            'stream').  The array should not be modified before the
+            item is plotted.  Permanent files ('filename') are always
+            written straight away.  The default is the value of
+            gp.GnuplotOpts.prefer_lazy_data.
+
+        'memory=<bool>' -- keep the temporary file in memory (on the
+            tmpfs gp.GnuplotOpts.memory_data_dir, or in a memfd) rather
+            than on disk.  Files that would take the memory used by
+            such files beyond gp.GnuplotOpts.memory_data_bytes are
+            written to disk instead (see 'tempdirs').  Not used for
+            cached or lazy files.  Data kept in memory are not sent
+            through a FIFO unless 'fifo=1' is given.  The default is
+            the value of gp.GnuplotOpts.prefer_memory_data.
+
+        'fifo=<bool>' -- send the data through a FIFO (named pipe)
+            rather than a temporary file.  Only where FIFOs are
+            supported (gp.GnuplotOpts.support_fifo).  The default is
+            the value of gp.GnuplotOpts.prefer_fifo_data.
+
+        'transport=<string>' -- with 'auto', the options above that
+            select how the data are sent ('inline', 'binary',
+            'datablock', 'fifo', 'memory') are chosen by
+            'transports.policy', from the size of the data, the
+            version of gnuplot and 'replots'; options that are given
+            explicitly are kept.  The choice and its reasons are
+            stored in the 'transport' member of the item.  The
+            default is the value of gp.GnuplotOpts.default_transport
+            (None, meaning that the options have their usual
+            defaults).
+
+        'replots=<int>' -- the number of times the item is expected
+            to be plotted (e.g., by 'replot' or by changing other
+            items), used by 'transport="auto"'.  The default is 1.
+
+        'datablock=<bool>' -- send the data to gnuplot as a named
+            datablock, once per Gnuplot object, and refer to it by name
+            in plot commands, so that replots and hardcopies do not
+            send the data again.  The datablock is deleted when the
+            item is deleted or its 'release()' method is called.  Only
+            for text data; requires gnuplot 5.0 or later.  The default
+            is the value of gp.GnuplotOpts.prefer_datablock_data (for
+            text data that are not written to a permanent file).
+
+        'decimate=<string>' -- before the data are sent, reduce them
+            to the points that make a visible difference in a plot
+            'decimate_width' pixels wide.  With 'minmax' the points
+            are divided into one bucket per pixel column and the first,
+            last, smallest and largest values of each bucket are kept,
+            so spikes are never hidden; 'lttb' keeps about two points
+            per pixel column chosen by the Largest-Triangle-Three-
+            Buckets algorithm, which looks smoother but may miss
+            extremes.  The first column is taken as the x values (a
+            single column is plotted against its index, which is then
+            written as an x column).  The number of points left out is
+            stored in the 'decimated' member of the item.  The default
+            is the value of gp.GnuplotOpts.default_decimation.
+
+        'decimate_width=<int>' -- the plot width, in pixels, for
+            'decimate' and 'lod'.  The default is the value of
+            gp.GnuplotOpts.decimate_width.
+
+        'lod=<bool>' -- build a multi-resolution min/max summary of
+            the data once (see 'utils.MinMaxPyramid'), then each time
+            the item is plotted send only the points within the
+            current x range of the 'Gnuplot' object (as set by
+            'set_range('xrange', ...)'), at the resolution needed for
+            'decimate_width' pixels.  Zooming into a huge dataset then
+            stays fast.  The x values (the first column) must be
+            sorted.  The data are sent inline (binary data as float64
+            records); the array should not be modified while the item
+            is in use.
+
     The keyword arguments recognized by '_FileItem' can also be used
     here.
 
     """
 
+    if 'decimate' in keyw:
+        decimate = keyw['decimate']
+        del keyw['decimate']
+    else:
+        decimate = gp.GnuplotOpts.default_decimation
+
+    if 'decimate_width' in keyw:
+        decimate_width = keyw['decimate_width']
+        del keyw['decimate_width']
+    else:
+        decimate_width = gp.GnuplotOpts.decimate_width
+
+    if 'lod' in keyw:
+        lod = keyw['lod']
+        del keyw['lod']
+        if lod and decimate:
+            raise errors.OptionError('cannot use both decimate and lod')
+    else:
+        lod = 0
+
+    if (len(data) == 1 and isinstance(data[0], numpy.memmap)
+            and not (keyw.get('inline') or keyw.get('filename')
+                     or 'cols' in keyw or decimate or lod)):
+        # A memmap backed by a file can be plotted in place:
+        item = _memmap_item(data[0], keyw)
+        if item is not None:
+            return item
+
     if len(data) == 1:
         # data was passed as a single structure
         data = utils.float_array(data[0])
@@ -548,12 +1429,13 @@ def Data(*data, **keyw):
             data = data[:, numpy.newaxis]
     else:
         # data was passed column by column (for example,
-        # Data(x,y)); pack it into one big array (this will test
-        # that sizes are all the same):
-        data = utils.float_array(data)
-        dims = len(data.shape)
-        # transpose so that the last index selects x vs. y:
-        data = numpy.transpose(data, (dims-1,) + tuple(range(dims-1)))
+        # Data(x,y)); pack it into one big array, in which the last
+        # index selects x vs. y (this will test that sizes are all
+        # the same):
+        try:
+            data = numpy.stack([utils.float_array(d) for d in data], -1)
+        except ValueError:
+            raise errors.DataError('data columns must have the same shape')
     if 'cols' in keyw:
         cols = keyw['cols']
         del keyw['cols']
@@ -561,6 +1443,19 @@ def Data(*data, **keyw):
             cols = (cols,)
         data = numpy.take(data, cols, -1)
 
+    if decimate:
+        (data, decimated) = _decimate(data, decimate, decimate_width)
+    else:
+        decimated = 0
+
+    if lod:
+        # lod data are always sent inline:
+        keyw.pop('transport', None)
+        keyw.pop('replots', None)
+        decision = None
+    else:
+        decision = _transport_option('data', data, keyw)
+
     if 'filename' in keyw:
         filename = keyw['filename'] or None
         del keyw['filename']
@@ -577,18 +1472,118 @@ def Data(*data, **keyw):
     else:
         inline = (not filename) and gp.GnuplotOpts.prefer_inline_data
 
-    # Output the content into a string:
-    f = StringIO()
-    utils.write_array(f, data)
-    content = f.getvalue()
-    if inline:
-        return _InlineFileItem(content, **keyw)
-    elif filename:
-        return _NewFileItem(content, filename=filename, **keyw)
-    elif gp.GnuplotOpts.prefer_fifo_data:
-        return _FIFOFileItem(content, **keyw)
+    if 'stream' in keyw:
+        stream = keyw['stream']
+        del keyw['stream']
+    else:
+        stream = gp.GnuplotOpts.prefer_streaming_data
+
+    if 'precision' in keyw:
+        precision = keyw['precision']
+        del keyw['precision']
+    else:
+        precision = gp.GnuplotOpts.default_precision
+
+    if 'gaps' in keyw:
+        gaps = keyw['gaps']
+        del keyw['gaps']
+    else:
+        gaps = 0
+
+    if 'cache' in keyw:
+        cache = keyw['cache']
+        del keyw['cache']
+    else:
+        cache = gp.GnuplotOpts.prefer_cached_data
+
+    if 'lazy' in keyw:
+        lazy = keyw['lazy']
+        del keyw['lazy']
     else:
-        return _NewFileItem(content, **keyw)
+        lazy = gp.GnuplotOpts.prefer_lazy_data
+
+    if 'memory' in keyw:
+        memory = keyw['memory']
+        del keyw['memory']
+    else:
+        memory = gp.GnuplotOpts.prefer_memory_data
+
+    fifo = _fifo_option(keyw)
+
+    datablock = _datablock_option(keyw, filename)
+
+    if lod:
+        if filename:
+            raise errors.OptionError(
+                'lod data are sent inline and cannot be saved to a file')
+        return _PyramidItem(data, decimate_width, precision=precision, **keyw)
+
+    if keyw.get('binary', 0):
+        # Send the points as raw records of float32 or float64 numbers:
+        if len(data.shape) != 2:
+            raise errors.DataError(
+                'binary data must be one- or two-dimensional')
+        if data.dtype.name in _binary_types:
+            # (Without 'endian=', gnuplot reads the native byte order:)
+            dtype = data.dtype.newbyteorder('=')
+        else:
+            dtype = numpy.float32
+        (points, columns) = data.shape
+        keyw['binary'] = 'record=%d format="%s"' % (
+            points, _binary_format(dtype, columns),
+            )
+        content = _StreamedContent(utils.binary_chunks, data, dtype)
+        options = ('binary', numpy.dtype(dtype).name)
+    else:
+        content = _StreamedContent(
+            utils.array_chunks, data, precision,
+            gp.GnuplotOpts.missing_data, gaps,
+            )
+        options = ('text', precision, gp.GnuplotOpts.missing_data, gaps)
+    if cache:
+        key = ([data], options)
+    else:
+        key = None
+    item = _data_item(
+        content, inline, filename, stream, key, lazy, datablock,
+        memory=memory, fifo=fifo, **keyw)
+    item.decimated = decimated
+    item.transport = decision
+    return item
+
+
+def _binary_grid(data, xvals, yvals, dtype=numpy.float32):
+    """Generate the binary matrix form of grid data, a few rows at a time.
+
+    This is the format that 'splot' reads with the 'binary' option: a
+    first row holding 'numx' and the x values, then one row per y
+    value holding the y value and the data for that y value.  The rows
+    are built from 'data', 'xvals' and 'yvals' a block at a time (of
+    about 'utils.chunk_rows' numbers), so that no transposed copy of
+    the whole array is needed.  The numbers are written as 'dtype'
+    (float32 or float64).
+
+    """
+
+    (numx, numy) = data.shape
+
+    # It seems that the gnuplot documentation for binary mode
+    # disagrees with its actual behavior (as of v. 3.7).  The
+    # documentation has the roles of x and y exchanged.  We ignore
+    # the documentation and go with the code.
+
+    header = numpy.empty(numx + 1, dtype)
+    header[0] = numx
+    header[1:] = xvals
+    yield memoryview(header).cast('B')
+
+    rows = max(1, utils.chunk_rows // (numx + 1))
+    for start in range(0, numy, rows):
+        stop = min(start + rows, numy)
+        block = numpy.empty((stop - start, numx + 1), dtype)
+        block[:, 0] = yvals[start:stop]
+        block[:, 1:] = data[:, start:stop].T
+        yield memoryview(block).cast('B')
 
 
 def GridData(data, xvals=None, yvals=None,
@@ -610,14 +1605,47 @@ def GridData(data, xvals=None, yvals=None,
 
         'binary=<bool>' -- send data to gnuplot in binary format?
 
+        'dtype=<type>' -- the type of the numbers in binary data:
+            numpy.float32 (the default) or numpy.float64 (which keeps
+            full precision but requires
+            gp.GnuplotOpts.recognizes_binary_data).
+
         'inline=<bool>' -- send data to gnuplot "inline"?
 
         'filename=<string>' -- save data to a permanent file.
 
+        'precision=<int>' -- number of significant digits used for
+            text data (see 'Data').
+
+        'stream=<bool>' -- format text data chunk by chunk each time
+            the item is plotted rather than keeping a formatted copy
+            (see 'Data').
+
+        'cache=<bool>' -- take the temporary file from the data cache
+            (see 'Data').
+
+        'lazy=<bool>' -- format the data when the item is first
+            plotted (see 'Data').
+
+        'memory=<bool>' -- keep the temporary file in memory if
+            possible (see 'Data').
+
+        'fifo=<bool>' -- send the data through a FIFO (see 'Data').
+
+        'transport=<string>', 'replots=<int>' -- with 'auto', let
+            'transports.policy' choose how the data are sent (see
+            'Data').
+
+        'datablock=<bool>' -- send text data to gnuplot as a named
+            datablock (see 'Data').
+
     Note the unusual argument order!  The data are specified *before*
     the x and y values.  (This inconsistency was probably a mistake;
     after all, the default xvals and yvals are not very useful.)
 
+    Missing values (NaNs or masked values of a 'numpy.ma' array) are
+    handled as for 'Data'.
+
     'data' must be a data array holding the values of a function
     f(x,y) tabulated on a grid of points, such that 'data[i,j] ==
     f(xvals[i], yvals[j])'.  If 'xvals' and/or 'yvals' are omitted,
@@ -633,7 +1661,10 @@ def GridData(data, xvals=None, yvals=None,
 
     If 'binary=1' then the data are written to a file in a binary
     format that 'splot' can understand.  Binary format is faster and
-    usually saves disk space but is not human-readable.  If your
+    usually saves disk space but is not human-readable.  The binary
+    data are generated a few rows at a time straight from the arrays,
+    so they can also be streamed through a FIFO (with 'stream=1')
+    without a full-size copy ever being made.  If your
     version of gnuplot doesn't support binary format (it is a
     recently-added feature), this behavior can be disabled by setting
     the configuration variable
@@ -671,6 +1702,58 @@ def GridData(data, xvals=None, yvals=None,
                 'The size of yvals must be the same as the size of '
                 'the second dimension of the data array')
 
+    if 'transport' in keyw or gp.GnuplotOpts.default_transport:
+        # Let the policy see (and choose) 'inline' and 'filename' too:
+        keyw['filename'] = filename
+        if inline is not _unset:
+            keyw['inline'] = inline
+        decision = _transport_option('grid', data, keyw)
+        inline = keyw.pop('inline', _unset)
+        filename = keyw.pop('filename')
+    else:
+        keyw.pop('replots', None)
+        decision = None
+
+    if 'stream' in keyw:
+        stream = keyw['stream']
+        del keyw['stream']
+    else:
+        stream = gp.GnuplotOpts.prefer_streaming_data
+
+    if 'precision' in keyw:
+        precision = keyw['precision']
+        del keyw['precision']
+    else:
+        precision = gp.GnuplotOpts.default_precision
+
+    if 'cache' in keyw:
+        cache = keyw['cache']
+        del keyw['cache']
+    else:
+        cache = gp.GnuplotOpts.prefer_cached_data
+
+    if 'lazy' in keyw:
+        lazy = keyw['lazy']
+        del keyw['lazy']
+    else:
+        lazy = gp.GnuplotOpts.prefer_lazy_data
+
+    if 'memory' in keyw:
+        memory = keyw['memory']
+        del keyw['memory']
+    else:
+        memory = gp.GnuplotOpts.prefer_memory_data
+
+    fifo = _fifo_option(keyw)
+
+    if 'dtype' in keyw:
+        dtype = numpy.dtype(keyw['dtype'])
+        del keyw['dtype']
+        if dtype.name not in ['float32', 'float64']:
+            raise errors.OptionError('dtype=%s' % (dtype,))
+    else:
+        dtype = numpy.dtype(numpy.float32)
+
     # Binary defaults to true if recognizes_binary_plot is set;
     # otherwise it is forced to false.
     binary = keyw.get('binary', 1) and gp.GnuplotOpts.recognizes_binary_splot
@@ -686,57 +1769,427 @@ def GridData(data, xvals=None, yvals=None,
             'cannot pass data both inline and via a file'
             )
 
+    datablock = _datablock_option(keyw, filename)
+
     # xvals, yvals, and data are now all filled with arrays of data.
     if binary:
         if inline:
             raise errors.OptionError('binary inline data not supported')
 
         # write file in binary format
+        if dtype.name != 'float32':
+            keyw['binary'] = 'matrix format="%%%s"' % (dtype.name,)
+        content = _StreamedContent(_binary_grid, data, xvals, yvals, dtype)
+        options = ('binary grid', dtype.name)
+    else:
+        # output data to file as "x y f(x)" triplets, in blocks
+        # separated by blank lines so that gnuplot can connect the
+        # points into a grid.  The triplets are generated a few lines
+        # of the grid at a time:
+        content = _StreamedContent(
+            utils.grid_chunks, xvals, yvals, data, precision,
+            gp.GnuplotOpts.missing_data,
+            )
+        options = ('text grid', precision, gp.GnuplotOpts.missing_data)
+    if cache:
+        key = ([data, xvals, yvals], options)
+    else:
+        key = None
+    item = _data_item(
+        content, inline, filename, stream, key, lazy, datablock,
+        memory=memory, fifo=fifo, **keyw)
+    item.transport = decision
+    return item
 
-        # It seems that the gnuplot documentation for binary mode
-        # disagrees with its actual behavior (as of v. 3.7).  The
-        # documentation has the roles of x and y exchanged.  We ignore
-        # the documentation and go with the code.
 
-        mout = numpy.zeros((numy + 1, numx + 1), numpy.float32)
-        mout[0, 0] = numx
-        mout[0, 1:] = xvals.astype(numpy.float32)
-        mout[1:, 0] = yvals.astype(numpy.float32)
-        try:
-            # try copying without the additional copy implied by astype():
-            mout[1:, 1:] = numpy.transpose(data)
-        except:
-            # if that didn't work then downcasting from double
-            # must be necessary:
-            mout[1:, 1:] = numpy.transpose(data.astype(numpy.float32))
+class StreamingData(_FileItem):
+    """A data item to which points can be appended, e.g., for live plots.
+
+    The points are stored in a file that is opened once and then only
+    appended to, so the cost of adding points depends only on the
+    number of new points, not on the number of points plotted so far.
+    Example::
+
+        s = Gnuplot.StreamingData(with_='lines')
+        g.plot(s)
+        while running:
+            s.append([t, measure()], g)
+
+    Gnuplot still reads the whole file for every plot; it is told
+    that the file has changed by replotting (pass the 'Gnuplot' object
+    to 'append()', or call its 'refresh()' method).
 
-        content = mout.tostring()
-        if (not filename) and gp.GnuplotOpts.prefer_fifo_data:
-            return _FIFOFileItem(content, **keyw)
+    Keyword arguments:
+
+        'columns=<int>' -- the number of values per data point.  If
+            not specified, it is set by the first call to 'append()'.
+
+        'filename=<string>' -- store the points in this (permanent)
+            file rather than in a temporary file.
+
+        'binary=<bool>' -- store the points as float64 binary records
+            rather than as text.  Requires
+            gp.GnuplotOpts.recognizes_binary_data.
+
+        'precision=<int>' -- number of significant digits used for
+            text data (see 'Data').
+
+    The keyword arguments recognized by '_FileItem' can also be used
+    here.
+
+    """
+
+    __slots__ = ('temp', 'file', 'columns', 'binary', 'precision', 'points')
+
+    def __init__(self, columns=None, filename=None, **keyw):
+        (self.file, self.temp) = (None, False)
+        if 'binary' in keyw:
+            binary = keyw['binary']
+            del keyw['binary']
+            if binary and not gp.GnuplotOpts.recognizes_binary_data:
+                raise errors.OptionError(
+                    'Gnuplot.py is currently configured to reject binary data')
         else:
-            return _NewFileItem(content, filename=filename, **keyw)
-    else:
-        # output data to file as "x y f(x)" triplets.  This
-        # requires numy copies of each x value and numx copies of
-        # each y value.  First reformat the data:
-        aset = numpy.transpose(
-            numpy.array(
-                (numpy.transpose(numpy.resize(xvals, (numy, numx))),
-                 numpy.resize(yvals, (numx, numy)),
-                 data)), (1, 2, 0))
-
-        # Now output the data with the usual routine.  This will
-        # produce data properly formatted in blocks separated by blank
-        # lines so that gnuplot can connect the points into a grid.
-        f = StringIO()
-        utils.write_array(f, aset)
-        content = f.getvalue()
+            binary = 0
 
-        if inline:
-            return _InlineFileItem(content, **keyw)
-        elif filename:
-            return _NewFileItem(content, filename=filename, **keyw)
-        elif gp.GnuplotOpts.prefer_fifo_data:
-            return _FIFOFileItem(content, **keyw)
+        if 'precision' in keyw:
+            precision = keyw['precision']
+            del keyw['precision']
+        else:
+            precision = gp.GnuplotOpts.default_precision
+
+        if filename:
+            f = open(filename, 'wb')
+        else:
+            self.temp = True
+            (fd, filename,) = tempdirs.default().mkstemp(suffix='.gnuplot')
+            f = os.fdopen(fd, 'wb')
+            # If the user hasn't specified a title, set it to None so
+            # that the name of the temporary file is not used:
+            if 'title' not in keyw:
+                keyw['title'] = None
+        self.file = f
+
+        self.binary = binary
+        self.precision = precision
+        self.columns = None
+        self.points = 0
+        _FileItem.__init__(self, filename, **keyw)
+        if columns is not None:
+            self._set_columns(columns)
+
+    def _set_columns(self, columns):
+        self.columns = columns
+        if self.binary:
+            # No record count, so that gnuplot reads up to the end of
+            # the file:
+            self.set_option(binary='format="%s"' % (
+                _binary_format(numpy.float64, columns),))
+
+    def append(self, points, g=None):
+        """Append data points, then replot with 'g' if it is specified.
+
+        'points' is a 2-d array (or something that can be converted to
+        one) holding one data point per row.  A 1-d array (or a
+        sequence of numbers) is a single data point.  Only the new
+        points are written.
+
+        """
+
+        if self.file is None:
+            raise errors.DataError('stream is closed')
+        points = utils.float_array(points)
+        if len(points.shape) < 2:
+            points = points.reshape((1, -1))
+        elif len(points.shape) > 2:
+            raise errors.DataError('points must be a 1-d or 2-d array')
+        if self.columns is None:
+            self._set_columns(points.shape[1])
+        elif points.shape[1] != self.columns:
+            raise errors.DataError(
+                'expected points with %d values, not %d'
+                % (self.columns, points.shape[1]))
+
+        if points.shape[0]:
+            if self.binary:
+                content = utils.binary_chunks(points, numpy.float64)
+            else:
+                content = utils.row_chunks(
+                    points, self.precision, gp.GnuplotOpts.missing_data)
+            _write_content(self.file.write, content)
+            # Make sure that gnuplot sees the new points:
+            self.file.flush()
+            self.points += points.shape[0]
+
+        if g is not None:
+            g.refresh()
+
+    def clear(self, g=None):
+        """Delete all of the points, then replot with 'g' if specified."""
+
+        if self.file is None:
+            raise errors.DataError('stream is closed')
+        self.file.seek(0)
+        self.file.truncate()
+        self.points = 0
+        if g is not None:
+            g.refresh()
+
+    def close(self):
+        """Close the file; no more points can be appended (or cleared).
+
+        The points written so far can still be plotted.
+
+        """
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def prepare(self, g):
+        if self.temp:
+            g.tempdir().adopt(self)
+
+    def __del__(self):
+        self.close()
+        # (__init__ may have failed before creating the file:)
+        if self.temp and getattr(self, 'filename', None):
+            tempdirs.remove(self.filename)
+
+
+class _InlineRowsItem(_FileItem):
+    """A _FileItem that sends a new selection of data points inline each plot.
+
+    This class is not meant for users but rather as a base class for
+    items whose data change from plot to plot.  Derived classes
+    implement 'select(g)', which returns the points to be plotted by
+    the Gnuplot object 'g' (which can be None) as a list of 2-d arrays
+    that are sent one after the other.  The selection is made in
+    'prepare()', so that the record count of binary data is known
+    when the plot command is built.  An empty selection is sent as a
+    single point of missing values, since gnuplot rejects inline data
+    without any points.
+
+    Keyword arguments:
+
+        'binary=<bool>' -- send the points as float64 binary records
+            rather than as text.  Requires
+            gp.GnuplotOpts.recognizes_binary_data.
+
+        'precision=<int>' -- number of significant digits used for
+            text data (see 'Data').
+
+    The keyword arguments recognized by '_FileItem' can also be used
+    here.
+
+    """
+
+    __slots__ = ('columns', 'binary', 'precision', '_selection')
+
+    def __init__(self, columns, **keyw):
+        if 'binary' in keyw:
+            binary = keyw['binary']
+            del keyw['binary']
+        else:
+            binary = 0
+
+        if 'precision' in keyw:
+            precision = keyw['precision']
+            del keyw['precision']
+        else:
+            precision = gp.GnuplotOpts.default_precision
+
+        # If the user hasn't specified a title, set it to None so that
+        # '-' is not used:
+        if 'title' not in keyw:
+            keyw['title'] = None
+
+        self.columns = columns
+        self.binary = binary
+        self.precision = precision
+        self._selection = None
+        _FileItem.__init__(self, '-', **keyw)
+        if binary:
+            self._set_records(0)
+
+    def _set_records(self, count):
+        option = 'record=%d format="%s"' % (
+            count, _binary_format(numpy.float64, self.columns))
+        if self._options.get('binary', (None,))[0] != option:
+            self.set_option(binary=option)
+
+    def select(self, g):
+        raise NotImplementedError()
+
+    def prepare(self, g):
+        selection = self.select(g)
+        count = sum([len(a) for a in selection])
+        if not count:
+            selection = [numpy.full((1, self.columns), numpy.nan)]
+            count = 1
+        self._selection = selection
+        if self.binary:
+            self._set_records(count)
+
+    def pipein(self, f):
+        if self._selection is None:
+            self.prepare(None)
+        selection = self._selection
+        self._selection = None
+        for a in selection:
+            if self.binary:
+                content = utils.binary_chunks(a, numpy.float64)
+            else:
+                content = utils.row_chunks(
+                    a, self.precision, gp.GnuplotOpts.missing_data)
+            _write_content(f.write_bytes, content)
+        if not self.binary:
+            f.write_bytes(b'e\n')
+
+
+class RingBufferData(_InlineRowsItem):
+    """A window holding the most recent data points, e.g., for live plots.
+
+    The points are kept in a preallocated array of 'capacity' points
+    of 'columns' values each.  Adding a point takes constant time;
+    once the buffer is full, each new point replaces the oldest one.
+    Each time the item is plotted, the points in the buffer are sent
+    inline to gnuplot, oldest first, straight from the two parts of
+    the array (without joining them first).  Example::
+
+        r = Gnuplot.RingBufferData(1000, 2, with_='lines')
+        while running:
+            r.push((t, measure()))
+            g.plot(r)
+
+    Points may be pushed from another thread while the item is being
+    plotted; the plot then shows some of the new values in place of
+    the oldest ones.
+
+    Members:
+
+        'data' -- the array holding the points.
+
+        'pushed' -- the number of points pushed since the item was
+            created.
+
+        'dropped' -- the number of points that were pushed out of the
+            buffer by newer points.
+
+    The keyword arguments are those of '_InlineRowsItem' ('binary'
+    and 'precision') and '_FileItem'.
+
+    """
+
+    __slots__ = ('data', 'next', 'count', 'pushed', 'dropped', '_lock')
+
+    def __init__(self, capacity, columns=1, **keyw):
+        self.data = numpy.zeros((capacity, columns), numpy.float64)
+        self.next = 0      # index of the slot for the next point
+        self.count = 0     # number of points in the buffer
+        self.pushed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        _InlineRowsItem.__init__(self, columns, **keyw)
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        # An item is true even while its buffer is empty:
+        return True
+
+    def push(self, point):
+        """Add one data point (a sequence of 'columns' numbers)."""
+
+        with self._lock:
+            self.data[self.next] = point
+            self.next += 1
+            if self.next == len(self.data):
+                self.next = 0
+            if self.count < len(self.data):
+                self.count += 1
+            else:
+                self.dropped += 1
+            self.pushed += 1
+
+    def extend(self, points):
+        """Add several data points, given as an array with one per row."""
+
+        capacity = len(self.data)
+        points = numpy.asarray(points).reshape((-1, self.data.shape[1]))
+        n = len(points)
+        if n > capacity:
+            points = points[-capacity:]
+        m = len(points)
+        with self._lock:
+            # Fill up to the end of the array, then wrap around:
+            first = min(m, capacity - self.next)
+            self.data[self.next:self.next + first] = points[:first]
+            self.data[:m - first] = points[first:]
+            self.next = (self.next + m) % capacity
+            self.dropped += max(0, self.count + n - capacity)
+            self.count = min(capacity, self.count + n)
+            self.pushed += n
+
+    def clear(self):
+        """Remove all of the points (the counters are not reset)."""
+
+        with self._lock:
+            (self.next, self.count) = (0, 0)
+
+    def window(self):
+        """Return the points in the buffer, oldest first.
+
+        The points are returned as a list of one or two views of
+        'data', which together hold the points in order.
+
+        """
+
+        with self._lock:
+            first = (self.next - self.count) % len(self.data)
+            if first + self.count <= len(self.data):
+                return [self.data[first:first + self.count]]
+            else:
+                return [self.data[first:], self.data[:self.next]]
+
+    def select(self, g):
+        return self.window()
+
+
+class _PyramidItem(_InlineRowsItem):
+    """A data item that sends only the points visible at the current zoom.
+
+    A 'utils.MinMaxPyramid' of the data is built once.  Each time the
+    item is plotted by a 'Gnuplot' object, the points within that
+    object's current x range (as set by its 'set_range()' method) are
+    selected at the coarsest resolution that still shows every
+    extreme at 'width' pixels, and sent inline.  Use 'Data(...,
+    lod=1)' to create one.
+
+    """
+
+    __slots__ = ('data', 'pyramid', 'width')
+
+    def __init__(self, data, width, **keyw):
+        if len(data.shape) != 2:
+            raise errors.DataError(
+                'only one- and two-dimensional data can be zoomed')
+        self.data = data
+        self.pyramid = utils.MinMaxPyramid(data)
+        self.width = width
+        columns = max(data.shape[1], 2)
+        _InlineRowsItem.__init__(self, columns, **keyw)
+
+    def select(self, g):
+        if g is None:
+            (xmin, xmax) = (None, None)
+        else:
+            (xmin, xmax) = g.ranges.get('xrange', (None, None))
+        keep = self.pyramid.select(xmin, xmax, self.width)
+        self.decimated = len(self.data) - len(keep)
+        if self.data.shape[1] == 1:
+            # Plot against the original indices:
+            return [numpy.column_stack((keep, self.data[keep, 0]))]
         else:
-            return _NewFileItem(content, **keyw)
+            return [self.data[keep]]
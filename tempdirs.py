@@ -0,0 +1,547 @@
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""tempdirs.py -- Private directories for temporary data files.
+
+Temporary data files used to be created directly in the system's
+temporary directory and deleted by the '__del__' method of the
+PlotItem that used them, which leaves them behind whenever '__del__'
+is not called (reference cycles, crashes, 'os._exit()').  Instead,
+they are now created in a 'TempDir', a private directory that is
+deleted with all of its contents:
+
+  - when its 'close()' method is called (each Gnuplot object closes
+    its own TempDir when it is closed);
+
+  - when the TempDir is garbage-collected or the interpreter exits;
+
+  - by the next process that imports this module, if the process
+    that created the directory died without doing either (see
+    'sweep()').  Each directory holds a lock file that its process
+    keeps locked (where 'fcntl.flock()' is available), so that this
+    also works when the temporary directory is shared with processes
+    in other PID namespaces, e.g., other containers.
+
+Other modules create their private directories with 'mkdtemp()' so
+that they are swept the same way (e.g., the FIFOs of 'fifopool').
+
+Data files are created in the process-wide 'default()' TempDir.
+When an item is plotted, its Gnuplot object moves the file into its
+own TempDir ('adopt()'), so that the disk space used by a session
+can be measured ('usage()') and is released when the session is
+closed.  Files of items that are still alive at that time are moved
+back to the default TempDir.  Files of items that other sessions
+have plotted too are never moved, since those sessions may still be
+reading them by name.
+
+Data files can also be kept in memory ('write(..., memory=1)'):
+either in a subdirectory of a tmpfs such as '/dev/shm', or (with
+gp.GnuplotOpts.memory_data_dir = 'memfd', under Linux) in anonymous
+files created by 'os.memfd_create()', which gnuplot opens as
+'/proc/<pid>/fd/<fd>'.  The memory used by all such files is limited
+to gp.GnuplotOpts.memory_data_bytes; a file that would go over the
+limit is moved to disk while it is being written.
+
+"""
+
+import os, time, shutil, tempfile, threading, weakref
+
+try:
+    import fcntl
+except ImportError:
+    # Not available under Windows:
+    fcntl = None
+
+from . import gp
+
+
+# The names of all TempDirs start with this prefix followed by the
+# process id of their owner and '-':
+prefix = 'gnuplot_py3-'
+
+# The name of the lock file in each directory of a TempDir:
+lockname = '.lock'
+
+# All TempDirs that have not been closed yet:
+_registry = weakref.WeakSet()
+
+# The TempDirs (sessions) that have plotted each item:
+_plotted = weakref.WeakKeyDictionary()
+_plotted_lock = threading.Lock()
+
+
+def _lock_dir(dirname):
+    """Create and lock the lock file of the directory 'dirname'.
+
+    Return its file descriptor, which has to be kept open for as long
+    as the directory is in use, or None if locks are not supported.
+
+    """
+
+    if fcntl is None:
+        return None
+    fd = os.open(os.path.join(dirname, lockname), os.O_RDWR | os.O_CREAT,
+                 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def mkdtemp(suffix='', dir=None):
+    """Create a private directory that 'sweep()' recognizes.
+
+    Return '(dirname, fd)', where 'fd' is the file descriptor of the
+    lock file of the directory (None if locks are not supported).  It
+    has to be kept open for as long as the directory is in use; the
+    caller is responsible for closing it and for deleting the
+    directory, including the lock file named 'lockname'.
+
+    """
+
+    dirname = tempfile.mkdtemp(
+        suffix=suffix, prefix='%s%d-' % (prefix, os.getpid()), dir=dir)
+    return (dirname, _lock_dir(dirname))
+
+
+def _remove_dirs(dirnames, memfds, locks, pid):
+    # A forked child must not remove the files of its parent:
+    if os.getpid() == pid:
+        for fd in memfds.values():
+            os.close(fd)
+        memfds.clear()
+        for dirname in dirnames:
+            shutil.rmtree(dirname, ignore_errors=True)
+        for fd in locks:
+            os.close(fd)
+        del locks[:]
+
+
+class _SpillFile:
+    """A file in memory that is moved to disk if it grows too big.
+
+    'f' is the memory file, opened for reading and writing, and
+    'filename' its name.  When writing would make the file bigger
+    than 'limit' bytes, the data written so far are copied to a new
+    file in the TempDir 'tempdir' and writing goes on there.
+
+    """
+
+    def __init__(self, tempdir, f, filename, limit):
+        self.tempdir = tempdir
+        self.f = f
+        self.filename = filename
+        self.limit = limit
+        self.size = 0
+
+    def write(self, b):
+        n = memoryview(b).nbytes
+        if self.limit is not None and self.size + n > self.limit:
+            self.spill()
+        self.f.write(b)
+        self.size += n
+
+    def spill(self):
+        (fd, filename) = self.tempdir.mkstemp()
+        f = os.fdopen(fd, 'wb')
+        self.f.seek(0)
+        shutil.copyfileobj(self.f, f)
+        self.f.close()
+        remove(self.filename)
+        (self.f, self.filename, self.limit) = (f, filename, None)
+
+    def close(self):
+        self.f.close()
+
+
+class TempDir:
+    """A private directory holding temporary data files.
+
+    Members:
+
+        'dirname' -- the name of the directory.
+
+        'memdir' -- the name of the directory for files kept on a
+            tmpfs (created when first needed), or None.
+
+        'closed' -- true once the directory has been deleted.
+
+    """
+
+    def __init__(self):
+        pid = os.getpid()
+        (self.dirname, fd) = mkdtemp()
+        self.memdir = None
+        self._dirnames = [self.dirname]
+        self._locks = []
+        if fd is not None:
+            self._locks.append(fd)
+        self._memfds = {}
+        self._items = weakref.WeakSet()
+        # (adopt() may create 'memdir' while holding the lock:)
+        self._lock = threading.RLock()
+        self._finalizer = weakref.finalize(
+            self, _remove_dirs, self._dirnames, self._memfds, self._locks,
+            pid)
+        _registry.add(self)
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def mkstemp(self, suffix='.gnuplot', text=False):
+        """Create a file as 'tempfile.mkstemp()'; return '(fd, filename)'."""
+
+        return tempfile.mkstemp(suffix=suffix, dir=self.dirname, text=text)
+
+    def write(self, write, memory=0, suffix='.gnuplot'):
+        """Create a file, fill it with 'write(f)' and return its name.
+
+        'f' is opened in binary mode.  If 'memory' is set, the file is
+        kept in memory unless that would take the memory used by data
+        files beyond gp.GnuplotOpts.memory_data_bytes (or memory files
+        are not available), in which case it is written to disk.
+
+        """
+
+        f = None
+        if memory:
+            limit = gp.GnuplotOpts.memory_data_bytes - memory_usage()
+            if limit > 0:
+                f = self._memory_file(suffix, limit)
+        if f is None:
+            (fd, filename) = self.mkstemp(suffix)
+            f = _SpillFile(self, os.fdopen(fd, 'wb'), filename, None)
+        try:
+            write(f)
+        except:
+            f.close()
+            remove(f.filename)
+            raise
+        f.close()
+        return f.filename
+
+    def _memory_file(self, suffix, limit):
+        where = gp.GnuplotOpts.memory_data_dir
+        if where == 'memfd':
+            if not hasattr(os, 'memfd_create'):
+                return None
+            fd = os.memfd_create('gnuplot_py3')
+            filename = '/proc/%d/fd/%d' % (os.getpid(), fd)
+            with self._lock:
+                self._memfds[filename] = fd
+            f = open(fd, 'w+b', closefd=False)
+        else:
+            memdir = self._memory_dir()
+            if memdir is None:
+                return None
+            (fd, filename) = tempfile.mkstemp(suffix=suffix, dir=memdir)
+            f = os.fdopen(fd, 'w+b')
+        return _SpillFile(self, f, filename, limit)
+
+    def _memory_dir(self):
+        with self._lock:
+            if self.memdir is None:
+                parent = gp.GnuplotOpts.memory_data_dir
+                if not parent or not os.path.isdir(parent):
+                    return None
+                try:
+                    (self.memdir, fd) = mkdtemp(dir=parent)
+                except OSError:
+                    return None
+                self._dirnames.append(self.memdir)
+                if fd is not None:
+                    self._locks.append(fd)
+            return self.memdir
+
+    def adopt(self, item):
+        """Move the temporary file of 'item' into this directory.
+
+        Only files that are still in the default TempDir are moved;
+        a file that has already been adopted by another TempDir stays
+        there, and so does a file that another TempDir has been asked
+        to adopt (i.e., that another session has plotted).  'item'
+        must have a 'filename' member and a cached command
+        ('_command'), which is reset if the file is moved.
+
+        """
+
+        with self._lock:
+            if self.closed or item in self._items:
+                return
+            with _plotted_lock:
+                sessions = _plotted.setdefault(item, weakref.WeakSet())
+                sessions.add(self)
+                if len(sessions) > 1:
+                    return
+            if _move(item, default(), self):
+                self._items.add(item)
+
+    def usage(self):
+        """Return a dictionary with the number and total size of the files.
+
+        'memory_bytes' is the part of 'bytes' that is kept in memory.
+
+        """
+
+        (files, size) = _dir_usage(self.dirname)
+        (memfiles, memory) = self._memory_usage()
+        return {
+            'files': files + memfiles,
+            'bytes': size + memory,
+            'memory_bytes': memory,
+            }
+
+    def _memory_usage(self):
+        (files, size) = (0, 0)
+        if self.memdir is not None:
+            (files, size) = _dir_usage(self.memdir)
+        for fd in list(self._memfds.values()):
+            try:
+                size += os.fstat(fd).st_size
+            except OSError:
+                continue
+            files += 1
+        return (files, size)
+
+    def close(self):
+        """Delete the directory and the files that are no longer used.
+
+        The files of items that are still alive are moved back to the
+        default TempDir first.  Files of items that other open sessions
+        have plotted too are left where they are instead, and the
+        directories holding them are handed over to the default
+        TempDir.  Gnuplot must be done reading the files when this is
+        called.
+
+        """
+
+        with self._lock:
+            if self.closed:
+                return
+            target = default()
+            keep = set()
+            if target is not self:
+                for item in list(self._items):
+                    if item.filename not in self._memfds and _shared(
+                            item, self):
+                        keep.add(item.filename)
+                    else:
+                        _move(item, self, target)
+            self._items.clear()
+            if keep:
+                self._hand_over(keep, target)
+            self._finalizer()
+            _registry.discard(self)
+
+    def _hand_over(self, keep, target):
+        """Delete all files but 'keep' and give the directories to 'target'."""
+
+        for dirname in self._dirnames:
+            for entry in list(os.scandir(dirname)):
+                if entry.path not in keep and entry.name != lockname:
+                    remove(entry.path)
+        with target._lock:
+            target._dirnames.extend(self._dirnames)
+            target._locks.extend(self._locks)
+        del self._dirnames[:]
+        del self._locks[:]
+
+
+def _dir_usage(dirname):
+    """Return the number and total size of the files in 'dirname'."""
+
+    (files, size) = (0, 0)
+    try:
+        entries = list(os.scandir(dirname))
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.name == lockname:
+            continue
+        try:
+            size += entry.stat().st_size
+        except OSError:
+            continue
+        files += 1
+    return (files, size)
+
+
+def _shared(item, tempdir):
+    """Return true if sessions other than 'tempdir' have plotted 'item'."""
+
+    with _plotted_lock:
+        sessions = _plotted.get(item, ())
+        return any([d is not tempdir and not d.closed for d in sessions])
+
+
+def _move(item, source, target):
+    """Move the file of 'item' from TempDir 'source' to TempDir 'target'.
+
+    Return true if the file was moved, false if it is not in 'source'
+    or cannot be moved.
+
+    """
+
+    fd = source._memfds.pop(item.filename, None)
+    if fd is not None:
+        # The name stays valid as long as the descriptor is open:
+        target._memfds[item.filename] = fd
+        return True
+    dirname = os.path.dirname(item.filename)
+    if dirname == source.dirname:
+        dirname = target.dirname
+    elif source.memdir is not None and dirname == source.memdir:
+        dirname = target._memory_dir()
+        if dirname is None:
+            return False
+    else:
+        return False
+    filename = os.path.join(dirname, os.path.basename(item.filename))
+    try:
+        os.rename(item.filename, filename)
+    except OSError:
+        # e.g., an open file under Windows; leave it where it is:
+        return False
+    item.filename = filename
+    item._command = None
+    return True
+
+
+def remove(filename):
+    """Delete a temporary data file, unless it is gone already."""
+
+    for d in list(_registry):
+        fd = d._memfds.pop(filename, None)
+        if fd is not None:
+            os.close(fd)
+            return
+    try:
+        os.unlink(filename)
+    except FileNotFoundError:
+        pass
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default():
+    """Return the TempDir in which data files are first created."""
+
+    global _default
+    with _default_lock:
+        if _default is None or _default.closed:
+            _default = TempDir()
+        return _default
+
+
+def usage():
+    """Return the total 'usage()' of all of the open TempDirs."""
+
+    total = {'files': 0, 'bytes': 0, 'memory_bytes': 0}
+    for d in list(_registry):
+        for (key, value) in d.usage().items():
+            total[key] += value
+    return total
+
+
+def memory_usage():
+    """Return the number of bytes held by data files in memory."""
+
+    return sum([d._memory_usage()[1] for d in list(_registry)])
+
+
+def memory_available(size):
+    """Return true if a data file of 'size' bytes would be kept in memory."""
+
+    where = gp.GnuplotOpts.memory_data_dir
+    if where == 'memfd':
+        if not hasattr(os, 'memfd_create'):
+            return False
+    elif not where or not os.path.isdir(where):
+        return False
+    return size <= gp.GnuplotOpts.memory_data_bytes - memory_usage()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g., PermissionError: the process exists but isn't ours.
+        pass
+    return True
+
+
+def _abandoned(dirname, pid):
+    """Return true if the TempDir directory 'dirname' has no owner.
+
+    The owner keeps the lock file of the directory locked, so the
+    directory is abandoned if the lock can be taken, whatever the
+    PID namespace of the owner.  Directories without a lock file
+    (made by older versions, or where locks are not supported) are
+    abandoned if no process 'pid' exists, once they are a minute old
+    (a new one may not have its lock file yet).
+
+    """
+
+    if fcntl is not None:
+        try:
+            fd = os.open(os.path.join(dirname, lockname), os.O_RDWR)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        else:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            finally:
+                os.close(fd)
+            return True
+    try:
+        age = time.time() - os.stat(dirname).st_mtime
+    except OSError:
+        return False
+    return age > 60 and pid != os.getpid() and not _alive(pid)
+
+
+def sweep():
+    """Delete the directories left behind by processes that no longer exist.
+
+    This covers the directories of TempDirs and any others created by
+    'mkdtemp()'.  See '_abandoned()' for how this is decided, and
+    gp.GnuplotOpts.sweep_temp_dirs.
+
+    """
+
+    parents = [tempfile.gettempdir()]
+    memory_data_dir = gp.GnuplotOpts.memory_data_dir
+    if memory_data_dir and memory_data_dir != 'memfd':
+        parents.append(memory_data_dir)
+    for parent in parents:
+        try:
+            names = os.listdir(parent)
+        except OSError:
+            continue
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            try:
+                pid = int(name[len(prefix):].split('-', 1)[0])
+            except ValueError:
+                continue
+            dirname = os.path.join(parent, name)
+            if _abandoned(dirname, pid):
+                shutil.rmtree(dirname, ignore_errors=True)
+
+
+if gp.GnuplotOpts.sweep_temp_dirs:
+    sweep()
@@ -21,13 +21,17 @@ try:
     import gnuplot
     import gnuplot.plotitems, gnuplot.funcutils
 except ImportError:
-    # kludge in case Gnuplot hasn't been installed as a module yet:
-    import __init__
-    gnuplot = __init__
-    import plotitems
-    gnuplot.plotitems = plotitems
-    import funcutils
-    gnuplot.funcutils = funcutils
+    # kludge in case gnuplot hasn't been installed as a module yet:
+    # load this directory as the package 'gnuplot'.
+    import sys, importlib.util
+    _here = os.path.dirname(os.path.abspath(__file__))
+    _spec = importlib.util.spec_from_file_location(
+        'gnuplot', os.path.join(_here, '__init__.py'),
+        submodule_search_locations=[_here])
+    gnuplot = importlib.util.module_from_spec(_spec)
+    sys.modules['gnuplot'] = gnuplot
+    _spec.loader.exec_module(gnuplot)
+    import gnuplot.plotitems, gnuplot.funcutils
 
 
 def wait(msg=None, prompt='Press return to show results...\n'):
@@ -36,9 +40,60 @@ def wait(msg=None, prompt='Press return to show results...\n'):
     input(prompt)
 
 
+def sent(*items):
+    """Return the bytes that plotting 'items' sends to gnuplot."""
+
+    (fd, filename) = tempfile.mkstemp(suffix='.gp')
+    os.close(fd)
+    try:
+        g = gnuplot.Gnuplot(filename)
+        g.plot(*items)
+        g.close()
+        with open(filename, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(filename)
+
+
+def check_big_endian_binary():
+    a = np.array([[1.5, 2.0]], '>f8')
+    data = sent(gnuplot.Data(a, binary=1, inline=1))
+    assert data.endswith(np.array([[1.5, 2.0]]).tobytes()), data
+
+
+def check_empty_ring_buffer():
+    r = gnuplot.RingBufferData(10, 2)
+    assert r and len(r) == 0
+    # One row of missing values rather than no points at all:
+    data = sent(r)
+    assert data.endswith(b'notitle\n? ?\ne\n'), data
+    data = sent(gnuplot.RingBufferData(10, 2, binary=1))
+    assert b'record=1 ' in data, data
+
+
+def check_all_missing_block():
+    a = np.arange(12.).reshape(3, 2, 2)
+    a[1] = np.nan
+    data = gnuplot.utils.format_array(a, gaps=1)
+    # The empty block doesn't end the data set with a double blank line:
+    assert data == b'0.0 1.0\n2.0 3.0\n\n8.0 9.0\n10.0 11.0\n\n', data
+
+
+# Checks that need no gnuplot and no user, run before the others:
+checks = [
+    check_big_endian_binary,
+    check_empty_ring_buffer,
+    check_all_missing_block,
+    ]
+
+
 def main():
     """Exercise the Gnuplot module."""
 
+    for check in checks:
+        check()
+        print('%s: ok' % (check.__name__,))
+
     print(
         'This program exercises many of the features of gnuplot_py3.  The\n'
         'commands that are actually sent to gnuplot are printed for your\n'
@@ -136,6 +191,9 @@ def main():
         wait('title="title"')
         g.plot(gnuplot.File(filename1, title='title'))
 
+        wait('inline=1 (the file is sent through the pipe)')
+        g.plot(gnuplot.File(filename1, inline=1))
+
         print('Change File attributes after construction:')
         f = gnuplot.File(filename1)
         wait('Original')
@@ -181,6 +239,99 @@ def main():
         wait('with_="lp lt 4 lw 4"')
         g.plot(gnuplot.Data(d, with_='lp lt 4 lw 4'))
 
+        wait('Same thing, binary data in a file')
+        g.plot(gnuplot.Data(d, binary=1, inline=0, with_='lp lt 4 lw 4'))
+
+        wait('Same thing, temporary file kept in memory')
+        g.plot(gnuplot.Data(d, binary=1, inline=0, memory=1,
+                            with_='lp lt 4 lw 4'))
+
+        wait('Same thing, transport chosen by transports.policy')
+        item = gnuplot.Data(d, transport='auto', replots=3,
+                            with_='lp lt 4 lw 4')
+        g.plot(item)
+        print(item.transport)
+
+        wait('3-d data (a family of curves), transport chosen by the policy')
+        t = np.linspace(0, 10, 1000)
+        curves = np.array([np.transpose([t, np.sin(t + 0.1 * i)])
+                           for i in range(40)])
+        item = gnuplot.Data(curves, transport='auto', replots=5, with_='l')
+        g.plot(item)
+        print(item.transport)
+
+        wait('Same thing, binary inline data')
+        g.plot(gnuplot.Data(d, binary=1, inline=1, with_='lp lt 4 lw 4'))
+
+        wait('Same thing, text data with precision=3')
+        g.plot(gnuplot.Data(d, precision=3, with_='lp lt 4 lw 4'))
+
+        wait('Missing data (masked values), and the same with gaps=1')
+        ym = np.ma.masked_inside(y2, 0.5, 0.8)
+        g.plot(gnuplot.Data(x, ym, with_='lp'),
+               gnuplot.Data(x, ym - 1, gaps=1, with_='lp'))
+
+        wait('Same data twice through the data cache (one temp file)')
+        g.plot(gnuplot.Data(d, inline=0, cache=1, with_='lp'))
+        print(gnuplot.datacache.cache.stats())
+        g.replot(gnuplot.Data(d, inline=0, cache=1, with_='l lw 3'))
+        print(gnuplot.datacache.cache.stats())
+
+        wait('Lazy inline data, formatted when first plotted, then replot()')
+        g.plot(gnuplot.Data(d, inline=1, lazy=1, with_='lp'))
+        g.replot()
+
+        wait('Data in a named datablock; replot() does not resend it')
+        g.plot(gnuplot.Data(d, datablock=1, with_='lp'))
+        g.replot()
+
+        wait('StreamingData: append the points ten at a time')
+        s = gnuplot.StreamingData(with_='lp')
+        g.plot(s)
+        for i in range(0, len(d), 10):
+            s.append(d[i:i + 10], g)
+            time.sleep(0.1)
+        print('temporary files of this session: %s' % (g.tempdir().usage(),))
+
+        wait('RingBufferData: a window of the last 30 points')
+        r = gnuplot.RingBufferData(30, 3, with_='lp')
+        for point in d:
+            r.push(point)
+            g.plot(r)
+        print('pushed %d, dropped %d' % (r.pushed, r.dropped))
+
+        wait('A million noisy points with a spike, decimate="minmax"')
+        xx = np.linspace(-10, 10, 1000000)
+        yy = np.sin(xx) + np.random.normal(0, 0.05, len(xx))
+        yy[654321] = 3
+        item = gnuplot.Data(xx, yy, decimate='minmax', with_='l')
+        g.plot(item)
+        print('%d points were left out' % (item.decimated,))
+
+        wait('Same thing, decimate="lttb"')
+        g.plot(gnuplot.Data(xx, yy, decimate='lttb', with_='l'))
+
+        wait('Same thing with lod=1, then zoom in with set_range()')
+        item = gnuplot.Data(xx, yy, lod=1, with_='l')
+        g.plot(item)
+        for width in [5, 1, 0.2, 0.05]:
+            g.set_range('xrange', (3 - width, 3 + width))
+            g.refresh()
+            print('%d points were left out' % (item.decimated,))
+            time.sleep(0.5)
+        g.set_range('xrange', None)
+
+        wait('Same zoom, each frame sent in one batch')
+        for width in [5, 1, 0.2, 0.05]:
+            with g.batch():
+                g.set_range('xrange', (3 - width, 3 + width))
+                g.title('width %g' % (width,))
+                g.refresh()
+            time.sleep(0.5)
+        with g.batch():
+            g.set_range('xrange', None)
+            g.title()
+
         wait('cols=0')
         g.plot(gnuplot.Data(d, cols=0))
 
@@ -334,6 +485,9 @@ def main():
         wait('The same thing using binary mode')
         g.splot(gnuplot.GridData(m, x, y, binary=1))
 
+        wait('Same thing, binary float64 data')
+        g.splot(gnuplot.GridData(m, x, y, binary=1, dtype=np.float64))
+
         wait('Same thing, using binary mode and an intermediate file')
         gnuplot.GridData(m, x, y, binary=1, filename=filename1)
         g.splot(gnuplot.File(filename1, binary=1))
@@ -0,0 +1,321 @@
+# Copyright (C) 2021 Joaquin Abian <gatoygata2@gmail.com>
+#
+# This file is licensed under the GNU Lesser General Public License
+# (LGPL).  See LICENSE.txt for details.
+
+"""transports.py -- Choose how the data of a PlotItem are sent to gnuplot.
+
+Data can reach gnuplot inline (through the command pipe), as a
+datablock, through a FIFO, or in a temporary file on disk or in
+memory, as text or as binary.  Which one is fastest depends on the
+size of the data, on whether they are plotted once or many times,
+and on what the local gnuplot and operating system support.  Rather
+than setting the individual options ('inline', 'binary', 'datablock',
+'fifo', 'memory'), Data and GridData can be given 'transport="auto"'
+(or gp.GnuplotOpts.default_transport can be set to 'auto'), in which
+case the 'TransportPolicy' in 'policy' makes the choice.  Options
+that are given explicitly are never overridden.
+
+The thresholds of the policy can be measured on the local machine by
+the 'calibration' module; the results are stored in the file given
+by 'calibration_filename()', from which the policy reads them when it
+first makes a choice.
+
+Each choice is a 'Decision', which is stored in the 'transport'
+member of the item and in the history of the policy, and says which
+transport was chosen and why::
+
+    >>> d = gnuplot.Data(a, transport='auto', replots=10)
+    >>> print(d.transport)
+    binary memory file: about 3000000 bytes as text; plotted 10 time(s); ...
+
+"""
+
+import os, re, json
+from collections import deque
+import numpy
+
+from . import gp, tempdirs
+
+
+def gnuplot_version():
+    """Return the version of gnuplot as a tuple '(major, minor)'.
+
+    If gp.GnuplotOpts.gnuplot_version is set (i.e., to something
+    other than None), return that value.  Otherwise, run 'gnuplot
+    --version', and set 'gnuplot_version' accordingly for future
+    reference.  If the version cannot be determined, it is taken to
+    be '(0, 0)', so that no recent features are relied upon.
+
+    """
+
+    if gp.GnuplotOpts.gnuplot_version is None:
+        try:
+            g = os.popen('%s --version 2>&1' % gp.GnuplotOpts.gnuplot_command)
+            response = g.read()
+            g.close()
+        except OSError:
+            response = ''
+        m = re.search(r'gnuplot\s+(\d+)\.(\d+)', response)
+        if m:
+            gp.GnuplotOpts.gnuplot_version = (
+                int(m.group(1)), int(m.group(2)))
+        else:
+            gp.GnuplotOpts.gnuplot_version = (0, 0)
+    return tuple(gp.GnuplotOpts.gnuplot_version)
+
+
+def calibration_filename():
+    """Return the name of the file holding the calibration results.
+
+    This is gp.GnuplotOpts.calibration_file if it is set (an empty
+    string means that no file is used), otherwise
+    'gnuplot_py3/calibration.json' in the user's cache directory.
+
+    """
+
+    if gp.GnuplotOpts.calibration_file is not None:
+        return gp.GnuplotOpts.calibration_file
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'gnuplot_py3', 'calibration.json')
+
+
+class Decision:
+    """The transport chosen for one item, and the reasons for the choice.
+
+    Members:
+
+        'transport' -- a short description of the transport, e.g.
+            'inline text' or 'binary fifo'.
+
+        'options' -- the keyword options that select the transport,
+            e.g. '{"binary": 1, "fifo": 1}'.  Options given explicitly
+            by the caller are not included.
+
+        'reasons' -- a list of strings explaining the choice.
+
+    """
+
+    def __init__(self, transport, options, reasons):
+        self.transport = transport
+        self.options = options
+        self.reasons = reasons
+
+    def __str__(self):
+        return '%s: %s' % (self.transport, '; '.join(self.reasons))
+
+    def __repr__(self):
+        return '<Decision %r %r>' % (self.transport, self.options)
+
+
+# The options that select a transport:
+transport_options = ['inline', 'filename', 'datablock', 'fifo', 'memory']
+
+
+class TransportPolicy:
+    """Choose a transport for Data and GridData items.
+
+    The choice is made by 'choose()', from an estimate of the size of
+    the data, the kind of item, the number of times the item is
+    expected to be plotted ('replots'), the version of gnuplot and the
+    GnuplotOpts that say what is supported.  The rules are:
+
+      - data that would take no more than 'inline_max_bytes' as text
+        and are plotted once are sent inline, with no files or
+        threads involved;
+
+      - data plotted several times are sent as a datablock (gnuplot
+        5.0 or later) if they take no more than 'datablock_max_bytes'
+        as text and cannot be sent as binary, so they go through the
+        pipe only once;
+
+      - other data are sent as binary if gnuplot can read them that
+        way (for Data, only one- or two-dimensional arrays without
+        'gaps'), and as text otherwise; through a FIFO if they are
+        plotted only once (nothing is written to disk; unless
+        'fifo_for_single_plots' is false), otherwise in a temporary
+        file that gnuplot can read again for each plot, in memory if
+        they fit in gp.GnuplotOpts.memory_data_bytes and on disk if
+        they don't.
+
+    The settings ('inline_max_bytes', 'datablock_max_bytes',
+    'fifo_for_single_plots') can be passed to the constructor or set
+    as attributes.  Otherwise, the first call of 'choose()' loads
+    them from the calibration file (see 'load()'), if there is one.
+
+    Members:
+
+        'history' -- the most recent decisions, as '(kind, shape,
+            decision)' tuples (at most 'history_length' of them).
+
+    """
+
+    inline_max_bytes = 64 * 1024
+    datablock_max_bytes = 16 * 1024 * 1024
+    fifo_for_single_plots = True
+    history_length = 100
+
+    def __init__(self, **keyw):
+        self.configure(keyw)
+        # Settings given explicitly are not replaced by calibration:
+        self.explicit = set(keyw)
+        self.loaded = False
+        self.history = deque(maxlen=self.history_length)
+
+    def configure(self, settings):
+        """Change the settings named by the keys of dictionary 'settings'."""
+
+        for (name, value) in settings.items():
+            if not hasattr(self, name):
+                raise TypeError('unknown TransportPolicy option %r' % (name,))
+            setattr(self, name, value)
+
+    def load(self, filename=None):
+        """Load settings from the calibration file 'filename'.
+
+        The default is 'calibration_filename()'.  Results measured with
+        a different gnuplot command or version are ignored.  If there
+        are no usable results and gp.GnuplotOpts.auto_calibrate is set,
+        calibrate now (see 'calibration.calibrate()').  Return true if
+        settings were loaded.
+
+        """
+
+        self.loaded = True
+        if filename is None:
+            filename = calibration_filename()
+        calibration = None
+        if filename:
+            try:
+                with open(filename) as f:
+                    calibration = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if calibration is not None and (
+                calibration.get('gnuplot_command')
+                != gp.GnuplotOpts.gnuplot_command
+                or tuple(calibration.get('gnuplot_version', ()))
+                != gnuplot_version()):
+            calibration = None
+        if calibration is None and gp.GnuplotOpts.auto_calibrate:
+            # (Imported here because calibration needs the whole package:)
+            from . import calibration as calibration_module
+            calibration = calibration_module.calibrate(filename=filename)
+        if calibration is None:
+            return False
+        self.configure(dict([
+            (name, value)
+            for (name, value) in calibration.get('policy', {}).items()
+            if name not in self.explicit
+            ]))
+        return True
+
+    def text_bytes(self, data, precision=None):
+        """Estimate the size of 'data' as text."""
+
+        if data.dtype.kind in 'iub':
+            per_value = 8
+        elif precision is None:
+            per_value = 20
+        else:
+            per_value = precision + 8
+        return data.size * per_value
+
+    def choose(self, kind, data, keyw, replots=1):
+        """Return a 'Decision' for plotting 'data'.
+
+        'kind' is 'data' for Data items and 'grid' for GridData items.
+        'keyw' holds the keyword options of the item, which are taken
+        into account but not changed: a transport option that is set
+        to a true value decides the transport, and one that is set to
+        a false value rules that transport out.  'replots' is the
+        number of times the item is expected to be plotted.
+
+        """
+
+        if not self.loaded:
+            self.load()
+        options = {}
+        reasons = []
+        precision = keyw.get('precision', gp.GnuplotOpts.default_precision)
+        text = self.text_bytes(data, precision)
+        opts = gp.GnuplotOpts
+        if kind == 'grid':
+            # Text grid data are written as "x y z" triplets:
+            text *= 3
+            binary_ok = opts.recognizes_binary_splot
+            binary_bytes = data.size * numpy.dtype(
+                keyw.get('dtype', numpy.float32)).itemsize
+        else:
+            binary_ok = opts.recognizes_binary_data
+            binary_bytes = data.size * data.dtype.itemsize
+            # Data are only sent as binary records if they form a
+            # single block of points:
+            if binary_ok and data.ndim > 2:
+                binary_ok = False
+                reasons.append('%d-d data are sent as text' % (data.ndim,))
+            elif binary_ok and keyw.get('gaps'):
+                binary_ok = False
+                reasons.append('gaps are left out of text data only')
+        if 'binary' in keyw:
+            binary_ok = binary_ok and keyw['binary']
+            reasons.append('binary=%r given' % (keyw['binary'],))
+        reasons.append('about %d bytes as text' % (text,))
+        reasons.append('plotted %d time(s)' % (replots,))
+
+        given = [name for name in transport_options if keyw.get(name)]
+        if given:
+            reasons.append('transport given by %s' % (', '.join(given),))
+            decision = Decision(given[0], options, reasons)
+        elif (text <= self.inline_max_bytes and replots <= 1
+              and keyw.get('inline', 1)
+              and not (kind == 'grid' and keyw.get('binary'))):
+            options['inline'] = 1
+            reasons.append('small enough to send inline')
+            if keyw.get('binary'):
+                # (Only Data get here with binary=1 given.)
+                decision = Decision('inline binary', options, reasons)
+            else:
+                options['binary'] = 0
+                decision = Decision('inline text', options, reasons)
+        elif not binary_ok:
+            version = gnuplot_version()
+            if (replots > 1 and text <= self.datablock_max_bytes
+                    and keyw.get('datablock', 1)
+                    and opts.recognizes_datablocks and version >= (5, 0)):
+                options['datablock'] = 1
+                reasons.append('text is sent once as a datablock '
+                               '(gnuplot %d.%d)' % version)
+                decision = Decision('datablock', options, reasons)
+            else:
+                decision = self._file(
+                    'text', text, replots, keyw, options, reasons)
+        else:
+            options['binary'] = 1
+            reasons.append('%d bytes as binary' % (binary_bytes,))
+            decision = self._file(
+                'binary', binary_bytes, replots, keyw, options, reasons)
+        self.history.append((kind, data.shape, decision))
+        return decision
+
+    def _file(self, form, size, replots, keyw, options, reasons):
+        options['inline'] = 0
+        if (replots <= 1 and gp.GnuplotOpts.support_fifo
+                and self.fifo_for_single_plots and keyw.get('fifo', 1)):
+            options['fifo'] = 1
+            reasons.append('plotted once, so written to a FIFO')
+            return Decision('%s fifo' % (form,), options, reasons)
+        options['fifo'] = 0
+        if replots > 1:
+            reasons.append('gnuplot rereads a file for each plot')
+        if keyw.get('memory', 1) and tempdirs.memory_available(size):
+            options['memory'] = 1
+            reasons.append('fits in memory')
+            return Decision('%s memory file' % (form,), options, reasons)
+        reasons.append('written to disk')
+        return Decision('%s file' % (form,), options, reasons)
+
+
+# The policy used by Data and GridData:
+policy = TransportPolicy()
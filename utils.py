@@ -13,33 +13,76 @@ particularly gnuplot-related.
 
 """
 
+import warnings
 import numpy
 
-def float_array(m):
-    """Return the argument as a numpy array of type at least 'Float32'.
+from . import errors
 
-    Leave 'Float64' unchanged, but upcast all other types to
-    'Float32'.  Allow also for the possibility that the argument is a
-    python native type that can be converted to a numpy array using
-    'numpy.asarray()', but in that case don't worry about
-    downcasting to single-precision float.
+# Number of data points formatted at a time by 'array_chunks()'.  Each
+# chunk is formatted by a single string operation, so larger chunks
+# are (slightly) faster but use more memory.
+chunk_rows = 8192
+
+
+def float_array(m, integer=1):
+    """Return the argument as a numeric numpy array, copying if necessary.
+
+    float32 and float64 arrays are returned unchanged, without a copy
+    (views, memmaps, and non-contiguous arrays included).  So are
+    integer and boolean arrays if 'integer' is true, so that they can
+    be written to gnuplot through the integer fast path; otherwise
+    they are converted to float64.  float16 arrays are upcast to
+    float32 and all other arrays to float64.  Objects that are not
+    numpy arrays (e.g., nested lists) are converted using
+    'numpy.asarray()'.  In masked arrays ('numpy.ma'), masked values
+    are replaced by NaN.
+
+    Whenever an existing numpy array has to be copied, a
+    'DataCopyWarning' is issued so that needless copies can be
+    tracked down (for example by turning the warning into an error
+    with the 'warnings' module).
 
     """
 
-    try:
-        # Try Float32 (this will refuse to downcast)
-        return numpy.asarray(m, numpy.float32)
-    except TypeError:
-        # That failure might have been because the input array was
-        # of a wider data type than float32; try to convert to the
-        # largest floating-point type available:
-        # NOTE TBD: I'm not sure float_ is the best data-type for this...
+    if numpy.ma.isMaskedArray(m):
+        # Masked values are missing data, which are represented by
+        # NaN (this promotes integer arrays to float64):
+        mask = numpy.ma.getmaskarray(m)
+        if mask.any():
+            a = numpy.where(mask, numpy.nan, numpy.ma.getdata(m))
+        else:
+            a = m = numpy.ma.getdata(m)
+    elif isinstance(m, numpy.ndarray):
+        a = m
+    else:
         try:
-            return numpy.asarray(m, numpy.float_)
-        except TypeError:
-            # TBD: Need better handling of this error!
-            print("Fatal: array dimensions not equal!")
-            return None
+            a = numpy.asarray(m)
+        except ValueError:
+            raise errors.DataError('array dimensions not equal')
+
+    kind = a.dtype.kind
+    if kind == 'f' and a.dtype.itemsize in (4, 8):
+        return a
+    elif kind in 'biu' and integer:
+        return a
+    elif kind == 'f' and a.dtype.itemsize < 4:
+        dtype = numpy.float32
+    else:
+        dtype = numpy.float64
+
+    try:
+        result = a.astype(dtype)
+    except (TypeError, ValueError):
+        raise errors.DataError(
+            'data of type %s cannot be plotted' % (a.dtype,))
+    if a is m:
+        warnings.warn(
+            'copying %s array of shape %s to %s'
+            % (a.dtype, a.shape, numpy.dtype(dtype).name),
+            errors.DataCopyWarning, stacklevel=3,
+            )
+    return result
+
 
 def write_array(f, lols,
                 item_sep=' ',
@@ -101,3 +144,448 @@ def write_array(f, lols,
             f.write(nest_sep)
             write_array(f, subset,
                         item_sep, nest_prefix, nest_suffix, nest_sep)
+
+
+def _row_format(dtype, columns, precision=None):
+    """Return the format string for one line of 'columns' numbers.
+
+    Integers (and booleans) are written without a decimal part.
+    Floating-point numbers are written with '%g' to 'precision'
+    significant digits, or if 'precision' is None, with as many
+    digits as are needed to represent them exactly.
+
+    """
+
+    if dtype.kind in 'biu':
+        item = '%d'
+    elif precision is None:
+        item = '%s'
+    else:
+        item = '%%.%dg' % (precision,)
+    return ' '.join([item] * columns) + '\n'
+
+
+def _format(fmt, data, missing=None):
+    """Format all of the numbers in array 'data' with 'fmt'; return bytes.
+
+    'fmt' must contain one conversion per element of 'data' (taken in
+    C order).  Formatting everything with one '%' operation avoids
+    the per-point overhead of a Python loop.  If 'missing' (bytes) is
+    specified, it replaces every NaN in the output.
+
+    """
+
+    text = (fmt % tuple(data.ravel().tolist())).encode('ascii')
+    if missing is not None:
+        text = text.replace(b'nan', missing)
+    return text
+
+
+def _format_rows(rows, fmt, missing=None):
+    """Format a 2-d array as lines of text, returned as bytes.
+
+    'fmt' is the format of a single line (see '_row_format()').
+
+    """
+
+    return _format(fmt * rows.shape[0], rows, missing)
+
+
+def _split_at_gaps(lols, fmt, rows):
+    """Generate the formatted rows of a 2-d array, skipping missing points.
+
+    Points that contain a NaN are left out, and each run of them is
+    replaced by a single blank line, which makes gnuplot break the
+    line drawn through the points.  The runs are found with array
+    operations, so there is one Python iteration per run rather than
+    per point.  Return true if any point was written.
+
+    """
+
+    started = 0    # has any point been written yet?
+    gap = 0        # were points left out since the last one written?
+    for start in range(0, lols.shape[0], rows):
+        block = lols[start:start + rows]
+        bad = numpy.isnan(block).any(axis=1)
+        edges = numpy.flatnonzero(bad[1:] != bad[:-1]) + 1
+        bounds = [0] + edges.tolist() + [len(block)]
+        for (i, j) in zip(bounds[:-1], bounds[1:]):
+            if bad[i]:
+                gap = 1
+            else:
+                if gap and started:
+                    yield b'\n'
+                yield _format_rows(block[i:j], fmt)
+                started = 1
+                gap = 0
+    return started
+
+
+def array_chunks(lols, precision=None, missing=None, gaps=0, rows=None):
+    """Generate the gnuplot-readable form of an array as chunks of bytes.
+
+    This produces the same output as 'write_array()' with its default
+    separators, but the data points are formatted a block of 'rows'
+    points at a time (default: the module variable 'chunk_rows')
+    rather than one at a time.  The chunks are ASCII bytes that can be
+    written directly to a binary file or pipe.
+
+    If 'precision' is specified, floating-point numbers are written
+    in the compact '%g' format with that many significant digits.
+    Integer arrays are always written without a decimal part.
+
+    NaN values are written as the string 'missing' if it is
+    specified (e.g., the string set by gnuplot's 'set datafile
+    missing' command), and otherwise as 'nan'.  If 'gaps' is true,
+    data points containing a NaN are left out instead, and a blank
+    line is written in place of each run of them; blocks with no
+    points left are left out altogether.
+
+    """
+
+    if rows is None:
+        rows = chunk_rows
+    if lols.dtype.kind != 'f':
+        # Only floating-point arrays can hold NaNs:
+        (missing, gaps) = (None, 0)
+    elif isinstance(missing, str):
+        missing = missing.encode('ascii')
+
+    if len(lols.shape) == 1:
+        (columns,) = lols.shape
+        assert columns > 0
+        fmt = _row_format(lols.dtype, columns, precision)
+        yield _format_rows(lols[numpy.newaxis, :], fmt, missing)
+        return
+
+    # Each 2-d subarray is a block of points that is followed by a
+    # blank line.  Rather than recursing through the leading
+    # dimensions, view the array as a sequence of blocks and format as
+    # many rows at a time as possible, putting the blank lines at the
+    # block boundaries:
+    assert 0 not in lols.shape
+    (points, columns) = lols.shape[-2:]
+    blocks = lols.reshape((-1, points, columns))
+    fmt = _row_format(lols.dtype, columns, precision)
+    if gaps:
+        for block in blocks:
+            # An empty block must not add a second blank line, which
+            # would end the data set:
+            if (yield from _split_at_gaps(block, fmt, rows)):
+                yield b'\n'
+    elif points >= rows:
+        # Split each block into chunks:
+        for block in blocks:
+            for start in range(0, points, rows):
+                yield _format_rows(block[start:start + rows], fmt, missing)
+            yield b'\n'
+    else:
+        # Format several whole blocks at a time:
+        step = rows // points
+        block_fmt = fmt * points + '\n'
+        for start in range(0, blocks.shape[0], step):
+            group = blocks[start:start + step]
+            yield _format(block_fmt * group.shape[0], group, missing)
+
+
+def row_chunks(lols, precision=None, missing=None, rows=None):
+    """Generate the lines of text for the points of a 2-d array.
+
+    This is like 'array_chunks()' for a 2-d array, except that the
+    blank line that ends a block is left out, so that the output for
+    several arrays can be joined into one block of points (e.g., to
+    append points to a data file).
+
+    """
+
+    if rows is None:
+        rows = chunk_rows
+    if lols.dtype.kind != 'f':
+        missing = None
+    elif isinstance(missing, str):
+        missing = missing.encode('ascii')
+
+    fmt = _row_format(lols.dtype, lols.shape[1], precision)
+    for start in range(0, lols.shape[0], rows):
+        yield _format_rows(lols[start:start + rows], fmt, missing)
+
+
+def grid_chunks(xvals, yvals, data, precision=None, missing=None,
+                rows=None):
+    """Generate the text form of grid data as chunks of bytes.
+
+    The output is the same as that of 'array_chunks()' for the
+    (numx, numy, 3) array of the triplets '[xvals[i], yvals[j],
+    data[i,j]]': one line per point, with a blank line after each
+    value of x.  But the triplets are built from 'xvals', 'yvals' and
+    'data' a block of about 'rows' points at a time, so no full-size
+    copy of the grid is made.
+
+    """
+
+    if rows is None:
+        rows = chunk_rows
+    (numx, numy) = data.shape
+    dtype = numpy.result_type(xvals, yvals, data)
+    if numy >= rows:
+        # Split each line of the grid into chunks:
+        for i in range(numx):
+            for start in range(0, numy, rows):
+                stop = min(start + rows, numy)
+                block = numpy.empty((stop - start, 3), dtype)
+                block[:, 0] = xvals[i]
+                block[:, 1] = yvals[start:stop]
+                block[:, 2] = data[i, start:stop]
+                yield from row_chunks(block, precision, missing, rows)
+            yield b'\n'
+    else:
+        # Format several whole lines of the grid at a time:
+        lines = rows // numy
+        for start in range(0, numx, lines):
+            stop = min(start + lines, numx)
+            block = numpy.empty((stop - start, numy, 3), dtype)
+            block[:, :, 0] = xvals[start:stop, numpy.newaxis]
+            block[:, :, 1] = yvals
+            block[:, :, 2] = data[start:stop]
+            yield from array_chunks(block, precision, missing, rows=rows)
+
+
+def binary_chunks(data, dtype=None, rows=None):
+    """Generate the raw bytes of the rows of an array, a block at a time.
+
+    Each chunk holds 'rows' rows (default: the module variable
+    'chunk_rows') of 'data' converted to 'dtype' (default: leave the
+    type unchanged), in C order.  Blocks that need no conversion are
+    returned as memoryviews of the array rather than copied.
+
+    """
+
+    if rows is None:
+        rows = chunk_rows
+
+    for start in range(0, data.shape[0], rows):
+        block = data[start:start + rows]
+        if dtype is not None:
+            block = block.astype(dtype, copy=False)
+        if block.flags.c_contiguous:
+            yield memoryview(block).cast('B')
+        else:
+            yield block.tobytes()
+
+
+def _plot_columns(data):
+    """Return the x values and the list of y columns of 2-d array 'data'.
+
+    The first column holds the x values, unless there is only one
+    column, in which case the values are plotted against their index.
+
+    """
+
+    if data.shape[1] == 1:
+        return (numpy.arange(data.shape[0]), [data[:, 0]])
+    else:
+        return (data[:, 0], [data[:, i] for i in range(1, data.shape[1])])
+
+
+def decimate_minmax(data, width):
+    """Return the indices of the points to plot 'width' pixels wide.
+
+    The points of the 2-d array 'data' (see '_plot_columns()') are
+    divided into 'width' buckets, one per pixel column: by x value if
+    the x values are sorted, otherwise into equal numbers of points.
+    The first and last points of each bucket are kept, plus the
+    points that hold the minimum and maximum of each y column, so a
+    line through the remaining points looks the same at that width
+    and no spikes are hidden.  At most '2 + 2 * <number of y columns>'
+    points are kept per bucket.  All the work is done by numpy array
+    operations.
+
+    """
+
+    n = data.shape[0]
+    (x, ys) = _plot_columns(data)
+    if n > 1 and x[-1] > x[0] and numpy.all(x[1:] >= x[:-1]):
+        buckets = ((x - x[0]) * (width / (x[-1] - x[0]))).astype(numpy.intp)
+        numpy.minimum(buckets, width - 1, out=buckets)
+    else:
+        buckets = numpy.arange(n) * width // n
+
+    # Number the non-empty buckets, and find where each starts and ends:
+    starts = numpy.flatnonzero(numpy.diff(buckets)) + 1
+    starts = numpy.concatenate(([0], starts))
+    ends = numpy.concatenate((starts[1:], [n]))
+    segment = numpy.zeros(n, numpy.intp)
+    segment[starts[1:]] = 1
+    numpy.cumsum(segment, out=segment)
+
+    keep = [starts, ends - 1]
+    for y in ys:
+        # fmin and fmax ignore NaNs:
+        for reduce in (numpy.fmin, numpy.fmax):
+            extreme = reduce.reduceat(y, starts)
+            hits = numpy.flatnonzero(y == extreme[segment])
+            (unused, first) = numpy.unique(segment[hits], return_index=True)
+            keep.append(hits[first])
+    return numpy.unique(numpy.concatenate(keep))
+
+
+def decimate_lttb(data, points):
+    """Return the indices of 'points' points chosen by LTTB.
+
+    The Largest-Triangle-Three-Buckets algorithm keeps the first and
+    last points and one point from each of 'points - 2' buckets of
+    the others: the one that forms the largest triangle with the
+    point kept from the previous bucket and the average of the next
+    bucket.  This follows the shape of the curve, including most
+    peaks, with fewer points than 'decimate_minmax()' (but without
+    its guarantee that extremes are kept).  Only the first y column
+    of 'data' (see '_plot_columns()') is considered.  The area
+    computation is vectorized within each bucket.
+
+    """
+
+    n = data.shape[0]
+    if points >= n or points < 3:
+        return numpy.arange(n)
+    (x, ys) = _plot_columns(data)
+    x = x.astype(numpy.float64)
+    y = ys[0].astype(numpy.float64)
+
+    edges = numpy.linspace(1, n - 1, points - 1).astype(numpy.intp)
+    keep = numpy.empty(points, numpy.intp)
+    keep[0] = a = 0
+    keep[-1] = n - 1
+    for i in range(points - 2):
+        (lo, hi) = (edges[i], edges[i + 1])
+        if i + 2 < len(edges):
+            (nlo, nhi) = (edges[i + 1], edges[i + 2])
+        else:
+            (nlo, nhi) = (n - 1, n)
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+        area = numpy.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (cy - y[a])
+            )
+        a = lo + numpy.argmax(numpy.nan_to_num(area, nan=-1.0))
+        keep[i + 1] = a
+    return keep
+
+
+def _pair_up(indices, key, better):
+    """Halve 'indices' by keeping the 'better' of each pair of neighbors."""
+
+    if len(indices) % 2:
+        indices = numpy.append(indices, indices[-1])
+    (a, b) = (indices[0::2], indices[1::2])
+    return numpy.where(better(key[b], key[a]), b, a)
+
+
+class MinMaxPyramid:
+    """A multi-resolution min/max summary of a data series, for zooming.
+
+    The points of the 2-d array 'data' (see '_plot_columns()'; the x
+    values must be sorted) are divided into buckets of 'base' points,
+    then 2 * 'base' points, and so on up to a single bucket.  For each
+    level and each y column, the indices of the minimum and maximum
+    in each bucket are stored (which takes about as much memory as
+    one index per point and column).  'select()' can then pick the
+    points needed to plot any x range at a given width in time
+    proportional to the width, not to the number of points.  The
+    pyramid is built with numpy array operations in O(n) time.
+
+    Members:
+
+        'x' -- the x values of the points.
+
+        'levels' -- a list of tuples '(size, mins, maxs)', from the
+            finest level to the coarsest, where 'size' is the number
+            of points per bucket and 'mins' and 'maxs' are lists
+            (one entry per y column) of arrays holding the index of
+            the minimum and maximum of each bucket.
+
+    """
+
+    def __init__(self, data, base=8):
+        (x, ys) = _plot_columns(data)
+        if len(x) > 1 and not numpy.all(x[1:] >= x[:-1]):
+            raise errors.DataError('the x values must be sorted')
+        self.x = x
+        self.levels = []
+
+        n = len(x)
+        size = base
+        if n <= size:
+            return
+        buckets = -(-n // size)
+        starts = numpy.arange(buckets) * size
+        (mins, maxs, min_keys, max_keys) = ([], [], [], [])
+        for y in ys:
+            # NaNs are never the minimum or maximum:
+            nan = numpy.isnan(y)
+            min_key = numpy.where(nan, numpy.inf, y)
+            max_key = numpy.where(nan, -numpy.inf, y)
+            padding = buckets * size - n
+            mins.append(starts + numpy.append(
+                min_key, [numpy.inf] * padding
+                ).reshape((buckets, size)).argmin(axis=1))
+            maxs.append(starts + numpy.append(
+                max_key, [-numpy.inf] * padding
+                ).reshape((buckets, size)).argmax(axis=1))
+            min_keys.append(min_key)
+            max_keys.append(max_key)
+
+        while True:
+            self.levels.append((size, mins, maxs))
+            if len(mins[0]) == 1:
+                break
+            size *= 2
+            mins = [_pair_up(m, k, numpy.less)
+                    for (m, k) in zip(mins, min_keys)]
+            maxs = [_pair_up(m, k, numpy.greater)
+                    for (m, k) in zip(maxs, max_keys)]
+
+    def select(self, xmin=None, xmax=None, width=2000):
+        """Return the indices of the points to plot for an x range.
+
+        The x range is 'xmin' to 'xmax' (None means unlimited); the
+        points just outside the range are included so that lines run
+        to the edges of the plot.  If there are no more than 2 *
+        'width' such points, all of them are returned.  Otherwise the
+        coarsest level that has at least 'width' buckets in the range
+        is used, and the first and last points plus the minima and
+        maxima of its buckets are returned.
+
+        """
+
+        x = self.x
+        n = len(x)
+        if xmin is None:
+            lo = 0
+        else:
+            lo = max(0, numpy.searchsorted(x, xmin, 'left') - 1)
+        if xmax is None:
+            hi = n
+        else:
+            hi = min(n, numpy.searchsorted(x, xmax, 'right') + 1)
+        if hi - lo <= 2 * width or not self.levels:
+            return numpy.arange(lo, hi)
+
+        for (size, mins, maxs) in reversed(self.levels):
+            if (hi - lo) // size >= width:
+                break
+        (b0, b1) = (lo // size, (hi - 1) // size + 1)
+        keep = numpy.unique(numpy.concatenate(
+            [[lo, hi - 1]] + [m[b0:b1] for m in mins + maxs]))
+        # The buckets at the ends can reach beyond the range:
+        return keep[(keep >= lo) & (keep < hi)]
+
+
+def format_array(lols, precision=None, missing=None, gaps=0):
+    """Return the gnuplot-readable form of an array as a bytes object.
+
+    See 'array_chunks()'.
+
+    """
+
+    return b''.join(array_chunks(lols, precision, missing, gaps))